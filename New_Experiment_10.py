@@ -0,0 +1,360 @@
+'''
+New Experiment 10: Persistent Inverted Index for Repeated Word Frequency Queries:
+Answering "how often does word X appear" or "top words in this corpus" with a Tutorial 2 style job rescans and retokenizes the
+whole file every time. Here a MapReduce job builds a compact on-disk inverted index over the WORD_RE tokens of a corpus once: a
+sorted term dictionary with per term counts, optional per term line offsets and a precomputed top-N order, all in fixed layouts
+that are memory-mapped and binary searched at query time. The index is rebuilt automatically when the source file changes.
+
+Input: Varied input text files (Eg. demo_input.txt, project_gutenberg_eBook_emma.txt, Tutorial_1_2_Input_1.txt)
+Output : Index build time and size, and the answers and latencies of term count, prefix and top-N queries
+
+'''
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+from array import array
+import json
+import mmap
+import re
+import shutil
+import struct
+import tempfile
+import time
+import datetime
+import os
+import sys
+
+# Same tokenization as Tutorial 2
+WORD_RE = re.compile(r"[\w']+")
+
+# Default directory holding one index per source file
+DEFAULT_INDEX_ROOT = '.word_index'
+
+# Index files
+TERMS_FILE = 'terms.bin'          # utf-8 terms, concatenated in sorted order
+ENTRIES_FILE = 'entries.bin'      # one ENTRY per term, in the same order
+POSTINGS_FILE = 'postings.bin'    # uint64 line offsets, grouped by term
+TOP_FILE = 'top.bin'              # uint32 term ids by descending count
+META_FILE = 'meta.json'
+
+# Term offset, term length, count, offset of the first posting, number of postings
+ENTRY = struct.Struct('<QIQQI')
+
+
+class MRInvertedIndexBuilder(MRJob):
+
+    def configure_args(self):
+        """Define custom arguments for building and querying the index."""
+        super(MRInvertedIndexBuilder, self).configure_args()
+        self.add_passthru_arg('--index-dir', default=None, help="Where to keep the index of the input file")
+        self.add_passthru_arg('--with-offsets', action='store_true', default=False,
+                              help="Also store the byte offsets of the lines each term appears on")
+        self.add_passthru_arg('--count', action='append', default=[], help="Term to count (repeatable)")
+        self.add_passthru_arg('--prefix', action='append', default=[], help="Prefix to look up (repeatable)")
+        self.add_passthru_arg('--top', type=int, default=10, help="Number of most frequent terms to list")
+
+    def steps(self):
+        return [
+            MRStep(mapper_raw=self.mapper_raw,
+                   reducer=self.reducer)
+        ]
+
+    def mapper_raw(self, input_path, input_uri):
+        # Read the file itself so line offsets are exact byte offsets, and aggregate per term in the mapper
+        counts = {}
+        offsets = {}
+        offset = 0
+
+        with open(input_path, 'rb') as f:
+            for raw_line in f:
+                for word in WORD_RE.findall(raw_line.decode('utf-8', 'replace')):
+                    word = word.lower()
+                    counts[word] = counts.get(word, 0) + 1
+                    if self.options.with_offsets:
+                        line_offsets = offsets.setdefault(word, [])
+                        if not line_offsets or line_offsets[-1] != offset:
+                            line_offsets.append(offset)
+                offset += len(raw_line)
+
+        for word, count in counts.items():
+            yield word, (count, offsets.get(word, []))
+
+    def reducer(self, word, counts_and_offsets):
+        total = 0
+        line_offsets = []
+        for count, offsets in counts_and_offsets:
+            total += count
+            line_offsets.extend(offsets)
+        line_offsets.sort()
+        yield word, (total, line_offsets)
+
+
+def default_index_dir(source):
+    """Index directory used for a source file when --index-dir is not given."""
+    return os.path.join(DEFAULT_INDEX_ROOT, os.path.basename(source))
+
+
+def source_signature(source):
+    """What we compare to decide whether the index is stale: the source's path, size and modification time."""
+    st = os.stat(source)
+    return {'source': os.path.abspath(source), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def index_is_fresh(index_dir, source, with_offsets=False):
+    """Whether *index_dir* holds an index of the current contents of *source* (with offsets, if asked for)."""
+    try:
+        with open(os.path.join(index_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta.get('signature') == source_signature(source) and (meta.get('with_offsets') or not with_offsets)
+
+
+def check_index_dir(index_dir):
+    """Raise ValueError unless *index_dir* is missing or holds an index, the only directories write_index() replaces."""
+    if os.path.lexists(index_dir) and not os.path.isfile(os.path.join(index_dir, META_FILE)):
+        raise ValueError('%s exists and does not hold an index (no %s), not replacing it' % (index_dir, META_FILE))
+
+
+def write_index_files(tmp_dir, postings, signature, with_offsets):
+    """Write the files of an index of *postings* into *tmp_dir* (see write_index())."""
+    terms = sorted(postings, key=lambda term: term.encode('utf-8'))
+    term_offset = 0
+    posting_offset = 0
+
+    with open(os.path.join(tmp_dir, TERMS_FILE), 'wb') as terms_file, \
+            open(os.path.join(tmp_dir, ENTRIES_FILE), 'wb') as entries_file, \
+            open(os.path.join(tmp_dir, POSTINGS_FILE), 'wb') as postings_file:
+        for term in terms:
+            encoded = term.encode('utf-8')
+            count, line_offsets = postings[term]
+            terms_file.write(encoded)
+            entries_file.write(ENTRY.pack(term_offset, len(encoded), count, posting_offset, len(line_offsets)))
+            array('Q', line_offsets).tofile(postings_file)
+            term_offset += len(encoded)
+            posting_offset += len(line_offsets)
+
+    # Term ids by descending count (ties in term order), so top-N is a prefix of this file
+    top = sorted(range(len(terms)), key=lambda i: -postings[terms[i]][0])
+    with open(os.path.join(tmp_dir, TOP_FILE), 'wb') as f:
+        array('I', top).tofile(f)
+
+    with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+        json.dump({
+            'signature': signature,
+            'with_offsets': with_offsets,
+            'num_terms': len(terms),
+            'num_tokens': sum(count for count, _ in postings.values()),
+        }, f)
+
+
+def write_index(index_dir, postings, signature, with_offsets):
+    """
+    Write the index files into a temporary directory and move it into place, so readers never see a partial index.
+
+    :param index_dir: Where the index goes.
+    :param postings: A dict of term -> (count, sorted line offsets).
+    :param signature: The source_signature() of the indexed file.
+    :param with_offsets: Whether line offsets were collected.
+    """
+    check_index_dir(index_dir)
+    parent_dir, name = os.path.split(os.path.abspath(index_dir))
+    tmp_dir = tempfile.mkdtemp(prefix=name + '.tmp-', dir=parent_dir)
+    try:
+        write_index_files(tmp_dir, postings, signature, with_offsets)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.rename(tmp_dir, index_dir)
+
+
+def build_index(source, index_dir, job_args):
+    """
+    Run the index building job over *source* and write its output as an index.
+
+    :return: The build time in seconds.
+    """
+    # Fail before running the job rather than after it
+    check_index_dir(index_dir)
+
+    start_time = time.time()
+    signature = source_signature(source)
+    options = MRInvertedIndexBuilder(args=job_args).options
+
+    job = MRInvertedIndexBuilder(args=job_args)
+    postings = {}
+    with job.make_runner() as runner:
+        runner.run()
+        for term, (count, line_offsets) in job.parse_output(runner.cat_output()):
+            postings[term] = (count, line_offsets)
+
+    os.makedirs(os.path.dirname(os.path.abspath(index_dir)), exist_ok=True)
+    write_index(index_dir, postings, signature, options.with_offsets)
+    return time.time() - start_time
+
+
+class InvertedIndex(object):
+    """Read-only view of an index directory. Files are memory-mapped, so opening an index reads almost nothing."""
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+
+        self._files = []
+        self.terms = self._map(os.path.join(index_dir, TERMS_FILE))
+        self.entries = self._map(os.path.join(index_dir, ENTRIES_FILE))
+        self.postings = self._map(os.path.join(index_dir, POSTINGS_FILE))
+        self.top_ids = self._map(os.path.join(index_dir, TOP_FILE))
+        self.num_terms = len(self.entries) // ENTRY.size
+
+    def _map(self, path):
+        f = open(path, 'rb')
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''  # mmap can't map an empty file
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for view in (self.terms, self.entries, self.postings, self.top_ids):
+            if isinstance(view, mmap.mmap):
+                view.close()
+        for f in self._files:
+            f.close()
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self.entries, i * ENTRY.size)
+
+    def _term_bytes(self, i):
+        term_offset, term_length = self._entry(i)[:2]
+        return self.terms[term_offset:term_offset + term_length]
+
+    def _lower_bound(self, key):
+        """Index of the first term >= key (as utf-8 bytes)."""
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def count(self, term):
+        """Number of occurrences of *term* (0 if it does not appear)."""
+        key = term.lower().encode('utf-8')
+        i = self._lower_bound(key)
+        if i < self.num_terms and self._term_bytes(i) == key:
+            return self._entry(i)[2]
+        return 0
+
+    def prefix(self, prefix, limit=None):
+        """(term, count) pairs of the terms starting with *prefix*, in term order."""
+        key = prefix.lower().encode('utf-8')
+        results = []
+        i = self._lower_bound(key)
+        while i < self.num_terms and (limit is None or len(results) < limit):
+            term = self._term_bytes(i)
+            if not term.startswith(key):
+                break
+            results.append((term.decode('utf-8'), self._entry(i)[2]))
+            i += 1
+        return results
+
+    def top(self, n):
+        """The *n* most frequent (term, count) pairs."""
+        results = []
+        for (i,) in struct.iter_unpack('<I', self.top_ids[:4 * min(n, self.num_terms)]):
+            results.append((self._term_bytes(i).decode('utf-8'), self._entry(i)[2]))
+        return results
+
+    def line_offsets(self, term):
+        """Byte offsets of the lines *term* appears on (empty unless built with --with-offsets)."""
+        key = term.lower().encode('utf-8')
+        i = self._lower_bound(key)
+        if i >= self.num_terms or self._term_bytes(i) != key:
+            return []
+        _, _, _, first, length = self._entry(i)
+        return [offset for (offset,) in struct.iter_unpack('<Q', self.postings[8 * first:8 * (first + length)])]
+
+
+def open_index(source, index_dir=None, job_args=None, with_offsets=False):
+    """
+    Open the index of *source*, (re)building it first if it is missing or the source has changed.
+
+    :param source: The corpus file.
+    :param index_dir: Where the index is kept (default: under .word_index/).
+    :param job_args: Command line arguments for the build job (runner, conf path, ...); the source is appended.
+    :param with_offsets: Whether the index must contain line offsets.
+
+    :return: (InvertedIndex, build time in seconds or None if the existing index was reused)
+    """
+    index_dir = index_dir or default_index_dir(source)
+    build_time = None
+    if not index_is_fresh(index_dir, source, with_offsets):
+        job_args = list(job_args or []) + (['--with-offsets'] if with_offsets else []) + [source]
+        build_time = build_index(source, index_dir, job_args)
+    return InvertedIndex(index_dir), build_time
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+#function to save result
+def save_result(build_time, index, queries, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "10", f"New_Experiment_10_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        if build_time is None:
+            f.write("Index build time: reused existing index\n")
+        else:
+            f.write("Index build time: {:.4f} seconds\n".format(build_time))
+        f.write("Terms: {}\n".format(index.num_terms))
+        f.write("Tokens: {}\n".format(index.meta['num_tokens']))
+        f.write("Index size: {} bytes\n".format(len(index.terms) + len(index.entries) + len(index.postings) + len(index.top_ids)))
+        for query, answer, latency in queries:
+            f.write("{}: {} ({:.3f} ms)\n".format(query, answer, latency * 1000))
+
+
+if __name__ == '__main__':
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    options = MRInvertedIndexBuilder(args=sys.argv[1:]).options
+
+    if is_task_invocation(options):
+        # Run a single mapper/reducer task of the index build
+        MRInvertedIndexBuilder.run()
+        sys.exit(0)
+
+    # Open the index, building it if it is missing or stale
+    index, build_time = open_index(input_filename, options.index_dir, sys.argv[1:-1], options.with_offsets)
+
+    # Answer the queries and time each of them
+    queries = []
+    for term in options.count:
+        start_time = time.time()
+        answer = index.count(term)
+        queries.append(("count({})".format(term), answer, time.time() - start_time))
+    for prefix in options.prefix:
+        start_time = time.time()
+        answer = index.prefix(prefix)
+        queries.append(("prefix({})".format(prefix), answer, time.time() - start_time))
+    start_time = time.time()
+    answer = index.top(options.top)
+    queries.append(("top({})".format(options.top), answer, time.time() - start_time))
+
+    # Print the answers
+    for query, answer, latency in queries:
+        print(query, answer)
+
+    # Save the performance metrics results
+    save_result(build_time, index, queries, input_filename)
+    index.close()
@@ -0,0 +1,236 @@
+'''
+New Experiment 11: Adaptive Combiner that Switches Itself On or Off at Runtime:
+Duplicated Experiment 2 keeps separate MRWordCountWithCombiner and MRWordCountWithoutCombiner classes, because a combiner helps on
+some inputs and only adds overhead on others (Eg. high cardinality keys). Here a job just declares its combiner and subclasses
+MRAdaptiveCombinerJob: every mapper task runs the combiner over its first --adaptive-sample-size output records, measures the
+reduction ratio (1 - records out / records in) and keeps combining only if the ratio reaches --adaptive-threshold. The decision
+and the ratio seen by each task are recorded in counters, so the tradeoff is chosen per task and per input.
+
+Input: Varied input text files (Eg. demo_input.txt, project_gutenberg_eBook_emma.txt, Tutorial_1_2_Input_1.txt)
+Output : Job output with the combining decision, reduction ratio, shuffled records and execution time of each mode
+
+'''
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+from mrjob.compat import jobconf_from_env
+import json
+import re
+import time
+import datetime
+import os
+import sys
+
+# Compile a regular expression pattern to match words
+WORD_RE = re.compile(r"[\w']+")
+
+COUNTER_GROUP = 'adaptive combiner'
+
+
+class MRAdaptiveCombinerJob(MRJob):
+    """
+    Base class for jobs whose combiner is sampled at runtime. Subclasses define mapper, combiner and reducer as usual;
+    the combiner is then applied map-side to batches of mapper output instead of as a separate phase, and is turned off
+    for the rest of the task when the first records it sees do not shrink enough.
+    """
+
+    def configure_args(self):
+        super(MRAdaptiveCombinerJob, self).configure_args()
+        self.add_passthru_arg('--adaptive-mode', choices=('auto', 'always', 'never'), default='auto',
+                              help="auto: decide per task by sampling, always/never: force the combiner on or off")
+        self.add_passthru_arg('--adaptive-sample-size', type=int, default=10000,
+                              help="Mapper output records sampled before deciding")
+        self.add_passthru_arg('--adaptive-threshold', type=float, default=0.5,
+                              help="Smallest reduction ratio for which the combiner is kept")
+        self.add_passthru_arg('--combine-buffer', type=int, default=10000,
+                              help="Mapper output records buffered between two combiner runs")
+        # Shared by every job below, so task processes can tell which job to run
+        self.add_passthru_arg('--job', choices=sorted(JOB_CLASSES), default='word-frequency', help="Job to run")
+        self.add_passthru_arg('--benchmark', action='store_true', default=False,
+                              help="Run the job with the combiner on auto, always and never")
+
+    def steps(self):
+        return [
+            MRStep(mapper_init=self.adaptive_mapper_init,
+                   mapper=self.adaptive_mapper,
+                   mapper_final=self.adaptive_mapper_final,
+                   reducer=self.reducer)
+        ]
+
+    def adaptive_mapper_init(self):
+        self.buffer = []
+        self.records_in = 0
+        self.records_out = 0
+        if self.options.adaptive_mode == 'auto':
+            self.combining = None  # Undecided until the sample is full
+        else:
+            self.combining = self.options.adaptive_mode == 'always'
+
+    def _combine(self, pairs):
+        """Group buffered (key, value) pairs by key and run the declared combiner over each group."""
+        groups = {}
+        for key, value in pairs:
+            groups.setdefault(json.dumps(key, sort_keys=True), (key, []))[1].append(value)
+        for key, values in groups.values():
+            for pair in self.combiner(key, iter(values)) or ():
+                yield pair
+
+    def _emit(self, pairs):
+        for pair in pairs:
+            self.records_out += 1
+            yield pair
+
+    def _decide(self):
+        """Combine the sample, record the ratio it achieved and choose whether to keep combining."""
+        sampled = len(self.buffer)
+        combined = list(self._combine(self.buffer))
+        self.buffer = []
+
+        ratio = 1.0 - float(len(combined)) / sampled if sampled else 0.0
+        self.combining = ratio >= self.options.adaptive_threshold
+
+        task = jobconf_from_env('mapreduce.task.partition', '0')
+        self.increment_counter(COUNTER_GROUP, 'tasks combining' if self.combining else 'tasks not combining', 1)
+        self.increment_counter(COUNTER_GROUP, 'records sampled', sampled)
+        self.increment_counter(COUNTER_GROUP, 'sampled records after combining', len(combined))
+        self.increment_counter(COUNTER_GROUP, 'task %s reduction ratio (per mille)' % task, int(round(ratio * 1000)))
+
+        return combined
+
+    def adaptive_mapper(self, key, value):
+        for pair in self.mapper(key, value) or ():
+            self.records_in += 1
+
+            if self.combining is False:
+                yield from self._emit([pair])
+                continue
+
+            self.buffer.append(pair)
+            if self.combining is None and len(self.buffer) >= self.options.adaptive_sample_size:
+                yield from self._emit(self._decide())
+            elif self.combining and len(self.buffer) >= self.options.combine_buffer:
+                yield from self._emit(self._combine(self.buffer))
+                self.buffer = []
+
+    def adaptive_mapper_final(self):
+        if self.combining is None:
+            # The task ended before the sample was full; decide on what we saw
+            yield from self._emit(self._decide())
+        elif self.buffer:
+            yield from self._emit(self._combine(self.buffer) if self.combining else self.buffer)
+        self.buffer = []
+
+        self.increment_counter(COUNTER_GROUP, 'mapper records in', self.records_in)
+        self.increment_counter(COUNTER_GROUP, 'records emitted (shuffled)', self.records_out)
+
+
+class MRWordCountWithAdaptiveCombiner(MRAdaptiveCombinerJob):
+    # Duplicated Experiment 2's word count: one key, so the combiner always pays off
+
+    def mapper(self, _, line):
+        yield 'words', len(line.split())
+
+    def combiner(self, key, values):
+        yield key, sum(values)
+
+    def reducer(self, key, values):
+        yield key, sum(values)
+
+
+class MRWordFrequencyWithAdaptiveCombiner(MRAdaptiveCombinerJob):
+    # Tutorial 2's per word counts: natural language repeats words, so the combiner usually pays off
+
+    def mapper(self, _, line):
+        for word in WORD_RE.findall(line):
+            yield word.lower(), 1
+
+    def combiner(self, word, counts):
+        yield word, sum(counts)
+
+    def reducer(self, word, counts):
+        yield word, sum(counts)
+
+
+class MRDistinctLinesWithAdaptiveCombiner(MRAdaptiveCombinerJob):
+    # Counts duplicate lines: keys are nearly all distinct, so combining only adds overhead
+
+    def mapper(self, _, line):
+        yield line, 1
+
+    def combiner(self, line, counts):
+        yield line, sum(counts)
+
+    def reducer(self, line, counts):
+        count = sum(counts)
+        if count > 1:
+            yield line, count
+
+
+JOB_CLASSES = {
+    'word-count': MRWordCountWithAdaptiveCombiner,
+    'word-frequency': MRWordFrequencyWithAdaptiveCombiner,
+    'distinct-lines': MRDistinctLinesWithAdaptiveCombiner,
+}
+
+
+def run_job(job_class, job_args):
+    """Run a job, returning its output, its counters and its execution time."""
+    job = job_class(args=job_args)
+    start_time = time.time()
+    with job.make_runner() as runner:
+        runner.run()
+        output = list(job.parse_output(runner.cat_output()))
+        counters = runner.counters()
+    return output, counters, time.time() - start_time
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+#function to save result
+def save_result(runs, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "11", f"New_Experiment_11_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        for mode, (output, counters, execution_time) in runs.items():
+            f.write("[{}] Execution time: {:.4f} seconds\n".format(mode, execution_time))
+            for step_counters in counters:
+                for name, value in sorted(step_counters.get(COUNTER_GROUP, {}).items()):
+                    f.write("[{}] {}: {}\n".format(mode, name, value))
+        outputs = [sorted(map(json.dumps, run[0])) for run in runs.values()]
+        f.write("Outputs match: {}\n".format(all(output == outputs[0] for output in outputs)))
+
+
+if __name__ == '__main__':
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    options = MRWordFrequencyWithAdaptiveCombiner(args=sys.argv[1:]).options
+    job_class = JOB_CLASSES[options.job]
+
+    if is_task_invocation(options):
+        # Run a single mapper/reducer task of the selected job
+        job_class.run()
+        sys.exit(0)
+
+    # Run the job, or run it with every combiner mode when benchmarking
+    job_args = [arg for arg in sys.argv[1:] if arg != '--benchmark']
+    runs = {}
+    if options.benchmark:
+        for mode in ('auto', 'always', 'never'):
+            runs[mode] = run_job(job_class, job_args + ['--adaptive-mode', mode])
+    else:
+        runs[options.adaptive_mode] = run_job(job_class, job_args)
+
+    # Print the job output
+    for key, value in list(runs.values())[0][0]:
+        print(key, value)
+
+    # Save the performance metrics results
+    save_result(runs, input_filename)
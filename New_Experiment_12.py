@@ -0,0 +1,397 @@
+'''
+New Experiment 12: Sampling-Based Approximate Execution with Error Bounds:
+For exploratory runs on large inputs (Eg. a full Wikipedia dump) an answer within about 1% is often enough. Here the counting and
+aggregation jobs (Tutorial 1 totals, Tutorial 2 word counts and the salary sums / top K of Tutorial 3) run on a sample of the input,
+scale the sampled totals up and report a confidence interval for every total.
+    - block sampling (default): the input is cut into --block-size byte blocks and a random --sample-fraction of them is chosen by
+      the driver. Mappers seek straight to the chosen offsets, so data in unsampled blocks is never read. Blocks are the sampling
+      units (cluster sampling), so the interval accounts for lines within a block being alike.
+    - random sampling: every line is kept with probability --sample-fraction (Bernoulli sampling). Every line is still read,
+      but only sampled lines are processed.
+With --verify the exact answer is computed too (all blocks), and the relative error and interval coverage are reported.
+
+Input: Varied input text files (Eg. project_gutenberg_eBook_emma.txt, Tutorial_1_2_Input_1.txt) or salaries.csv for --job salaries
+Output : Estimated totals with confidence intervals (and sampled top K for salaries), bytes read and execution time
+
+'''
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+from mrjob.compat import jobconf_from_env
+from statistics import NormalDist
+import csv
+import heapq
+import math
+import random
+import re
+import shutil
+import tempfile
+import time
+import datetime
+import os
+import sys
+
+# Compile a regular expression pattern to match words
+WORD_RE = re.compile(r"[\w']+")
+
+cols = 'Name,JobTitle,AgencyID,Agency,HireDate,AnnualSalary,GrossPay'.split(',')
+
+
+def read_block_lines(path, start, end):
+    """
+    Read the lines that start inside the byte range [start, end) of a file, seeking straight to it.
+    A line crossing the end of the range belongs to this block; one crossing its start belongs to the previous block.
+
+    :param path: Path of the input file.
+    :param start: Byte offset where the block starts.
+    :param end: Byte offset where the block ends.
+
+    :return: A generator of (line, size of the line in bytes).
+    """
+    with open(path, 'rb') as f:
+        if start > 0:
+            # Skip the rest of the line that started in the previous block
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            raw = f.readline()
+            if not raw:
+                break
+            yield raw.decode('utf-8', errors='replace').rstrip('\r\n'), len(raw)
+
+
+def estimate_total(total, sum_of_squares, options):
+    """
+    Scale a sampled total up to the population and compute the half width of its confidence interval.
+
+    :param total: Sum of the metric over the sampled units.
+    :param sum_of_squares: Sum of the squared per unit values.
+    :param options: Job options with the sampling parameters.
+
+    :return: (estimate, half width); the half width is None if it cannot be estimated from a single unit.
+    """
+    z = NormalDist().inv_cdf((1 + options.confidence) / 2)
+
+    if options.sample_mode == 'random':
+        # Horvitz-Thompson estimator for Bernoulli sampling with inclusion probability p
+        p = options.sample_fraction
+        variance = (1 - p) / (p * p) * sum_of_squares
+        return total / p, z * math.sqrt(variance)
+
+    # Expansion estimator for a simple random sample of n out of N blocks
+    N, n = options.population_units, options.sampled_units
+    estimate = float(N) / n * total
+    if n >= N:
+        return estimate, 0.0
+    if n < 2:
+        return estimate, None
+    sample_variance = max(sum_of_squares - total * total / n, 0.0) / (n - 1)
+    variance = N * N * (1 - float(n) / N) * sample_variance / n
+    return estimate, z * math.sqrt(variance)
+
+
+class MRApproximateJob(MRJob):
+    """
+    Base class for the approximate jobs. Subclasses yield (metric, value) pairs per line from unit_values() and
+    optionally (score, item) candidates from top_candidates(); the sampling, scaling and intervals are done here.
+    """
+
+    # On Hadoop, give every block manifest line (i.e. sampled block) its own mapper task
+    HADOOP_INPUT_FORMAT = 'org.apache.hadoop.mapred.lib.NLineInputFormat'
+
+    def hadoop_input_format(self):
+        # In random mode the input is the data itself, which keeps the default input format
+        if self.options.sample_mode == 'random':
+            return None
+        return self.HADOOP_INPUT_FORMAT
+
+    def configure_args(self):
+        super(MRApproximateJob, self).configure_args()
+        self.add_passthru_arg('--job', choices=sorted(JOB_CLASSES), default='totals', help="Job to run")
+        self.add_passthru_arg('--sample-mode', choices=('block', 'random'), default='block',
+                              help="block: read whole randomly chosen blocks, random: keep each line with --sample-fraction")
+        self.add_passthru_arg('--sample-fraction', type=float, default=0.01, help="Fraction of blocks or lines to sample")
+        self.add_passthru_arg('--block-size', type=int, default=64 * 1024, help="Size of the sampled blocks in bytes")
+        self.add_passthru_arg('--seed', type=int, default=0, help="Seed of the random sample")
+        self.add_passthru_arg('--confidence', type=float, default=0.95, help="Confidence level of the intervals")
+        self.add_passthru_arg('--top-k', type=int, default=10, help="Number of top items to report")
+        self.add_passthru_arg('--verify', action='store_true', default=False,
+                              help="Also compute the exact answer and report the error")
+        # Set by the driver for block sampling
+        self.add_passthru_arg('--population-units', type=int, default=0, help="Number of blocks in the input")
+        self.add_passthru_arg('--sampled-units', type=int, default=0, help="Number of sampled blocks")
+
+    def steps(self):
+        return [
+            MRStep(mapper_init=self.mapper_init,
+                   mapper=self.mapper,
+                   mapper_final=self.mapper_final,
+                   combiner=self.combiner,
+                   reducer=self.reducer)
+        ]
+
+    def unit_values(self, line):
+        """(metric, value) pairs of one line, summed per sampling unit; subclasses override this."""
+        return ()
+
+    def top_candidates(self, line):
+        """(score, item) pairs of one line for the sampled top K; subclasses may override this."""
+        return ()
+
+    def mapper_init(self):
+        task = jobconf_from_env('mapreduce.task.partition', '0')
+        self.random = random.Random('%s-%s' % (self.options.seed, task))
+        self.lines_read = 0
+        self.lines_sampled = 0
+
+    def _sample_unit(self, lines):
+        """Sum the metrics over the lines of one sampling unit and emit (sum, sum of squares) partials."""
+        totals = {}
+        for line in lines:
+            for metric, value in self.unit_values(line):
+                totals[metric] = totals.get(metric, 0) + value
+            for score, item in self.top_candidates(line):
+                yield ['top', None], [score, item]
+        for metric, value in totals.items():
+            yield ['total', metric], [value, value * value]
+
+    def mapper(self, _, line):
+        if self.options.sample_mode == 'random':
+            self.lines_read += 1
+            if self.random.random() < self.options.sample_fraction:
+                self.lines_sampled += 1
+                yield from self._sample_unit([line])
+            return
+
+        # Each input line names one sampled block; NLineInputFormat may prefix it with a byte offset
+        path, start, end = line.split('\t')[-3:]
+        self.bytes_read = 0
+
+        def lines():
+            for block_line, size in read_block_lines(path, int(start), int(end)):
+                self.bytes_read += size
+                yield block_line
+
+        yield from self._sample_unit(lines())
+        self.increment_counter('sampling', 'blocks read', 1)
+        self.increment_counter('sampling', 'bytes read', self.bytes_read)
+
+    def mapper_final(self):
+        if self.options.sample_mode == 'random':
+            self.increment_counter('sampling', 'lines read', self.lines_read)
+            self.increment_counter('sampling', 'lines sampled', self.lines_sampled)
+
+    def combiner(self, key, values):
+        if key[0] == 'top':
+            for value in heapq.nlargest(self.options.top_k, values):
+                yield key, value
+        else:
+            total, sum_of_squares = 0, 0
+            for value, square in values:
+                total += value
+                sum_of_squares += square
+            yield key, [total, sum_of_squares]
+
+    def reducer(self, key, values):
+        if key[0] == 'top':
+            # A sample's top K are lower bounds of the true top K; they cannot be scaled up
+            for score, item in heapq.nlargest(self.options.top_k, values):
+                yield ['top', item], [score, None]
+            return
+
+        total, sum_of_squares = 0, 0
+        for value, square in values:
+            total += value
+            sum_of_squares += square
+        yield ['total', key[1]], list(estimate_total(total, sum_of_squares, self.options))
+
+
+class MRApproximateTotals(MRApproximateJob):
+    # Tutorial 1's character, word and line totals
+
+    def unit_values(self, line):
+        yield "Total chars count: ", len(line)
+        yield "Total words count: ", len(line.split())
+        yield "Total lines count: ", 1
+
+
+class MRApproximateWordCount(MRApproximateJob):
+    # Tutorial 2's per word counts
+
+    def unit_values(self, line):
+        for word in WORD_RE.findall(line):
+            yield word.lower(), 1
+
+
+class MRApproximateSalaries(MRApproximateJob):
+    # Tutorial 3's salaries: employee count and payroll total, with the top K annual salaries of the sample
+
+    def unit_values(self, line):
+        row = dict(zip(cols, [a.strip() for a in next(csv.reader([line]))]))
+        yield 'employees', 1
+        try:
+            yield 'payroll', float(row['AnnualSalary'][1:].replace(',', ''))
+        except (KeyError, ValueError):
+            self.increment_counter('warn', 'missing salary', 1)
+
+    def top_candidates(self, line):
+        row = dict(zip(cols, [a.strip() for a in next(csv.reader([line]))]))
+        try:
+            yield float(row['AnnualSalary'][1:].replace(',', '')), row['Name']
+        except (KeyError, ValueError):
+            pass
+
+
+JOB_CLASSES = {
+    'totals': MRApproximateTotals,
+    'word-count': MRApproximateWordCount,
+    'salaries': MRApproximateSalaries,
+}
+
+
+def choose_blocks(input_paths, block_size, fraction, seed):
+    """
+    Cut the input files into blocks and pick a simple random sample of them.
+
+    :return: (number of blocks, the chosen (path, start, end) blocks in file order).
+    """
+    blocks = []
+    for path in input_paths:
+        size = os.path.getsize(path)
+        for start in range(0, size, block_size):
+            blocks.append((os.path.abspath(path), start, min(start + block_size, size)))
+
+    n = min(len(blocks), max(1, int(round(fraction * len(blocks)))))
+    chosen = random.Random(seed).sample(blocks, n)
+    # Read the chosen blocks in file order
+    return len(blocks), sorted(chosen)
+
+
+def write_block_manifest(blocks, manifest_path):
+    """Write one "path<TAB>start<TAB>end" line per block; each line becomes one mapper input record."""
+    with open(manifest_path, 'w') as f:
+        for path, start, end in blocks:
+            f.write('{}\t{}\t{}\n'.format(path, start, end))
+
+
+def run_job(job_class, job_args, input_paths, sample_mode, fraction, block_size, seed, temp_dir):
+    """Run the job on a sample of the input, returning {key: value}, its counters and its execution time."""
+    start_time = time.time()
+    args = job_args + ['--sample-mode', sample_mode, '--sample-fraction', str(fraction)]
+
+    if sample_mode == 'block':
+        population, blocks = choose_blocks(input_paths, block_size, fraction, seed)
+        manifest_path = os.path.join(temp_dir, 'blocks-%s.txt' % fraction)
+        write_block_manifest(blocks, manifest_path)
+        args += ['--population-units', str(population), '--sampled-units', str(len(blocks)), manifest_path]
+    else:
+        args += input_paths
+
+    job = job_class(args=args)
+    with job.make_runner() as runner:
+        runner.run()
+        results = {tuple(key): value for key, value in job.parse_output(runner.cat_output())}
+        counters = runner.counters()
+    return results, counters, time.time() - start_time
+
+
+def compare_with_exact(estimates, exact):
+    """Relative error of every estimated total and whether the exact value falls inside its interval."""
+    comparison = {}
+    for key, (estimate, half_width) in estimates.items():
+        if key[0] != 'total':
+            continue
+        true_value = exact.get(key, [0, 0])[0]
+        error = abs(estimate - true_value) / true_value if true_value else float(estimate != 0)
+        covered = half_width is not None and abs(estimate - true_value) <= half_width + 1e-9
+        comparison[key[1]] = (estimate, half_width, true_value, error, covered)
+    return comparison
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+def format_estimate(estimate, half_width):
+    if half_width is None:
+        return "{:.2f} (interval unknown, only one block sampled)".format(estimate)
+    return "{:.2f} +/- {:.2f}".format(estimate, half_width)
+
+
+#function to save result
+def save_result(options, approximate, exact, comparison, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "12", f"New_Experiment_12_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        f.write("Sample: {} sampling of {:.2%} of the input ({:.0%} confidence)\n".format(
+            options.sample_mode, options.sample_fraction, options.confidence))
+
+        for label, run in (('approximate', approximate), ('exact', exact)):
+            if run is None:
+                continue
+            results, counters, execution_time = run
+            f.write("[{}] Execution time: {:.4f} seconds\n".format(label, execution_time))
+            for step_counters in counters:
+                for name, value in sorted(step_counters.get('sampling', {}).items()):
+                    f.write("[{}] {}: {}\n".format(label, name, value))
+
+        if comparison:
+            covered = sum(1 for c in comparison.values() if c[4])
+            f.write("Exact value inside the interval: {} of {} totals ({:.1%})\n".format(
+                covered, len(comparison), float(covered) / len(comparison)))
+            # The largest totals are the ones the estimate is meant for
+            for metric, (estimate, half_width, true_value, error, covered) in sorted(
+                    comparison.items(), key=lambda item: -item[1][2])[:options.top_k]:
+                f.write("{}: estimate {}, exact {:.2f}, relative error {:.2%}, inside interval: {}\n".format(
+                    metric, format_estimate(estimate, half_width), true_value, error, covered))
+            f.write("Speedup: {:.2f}x\n".format(exact[2] / approximate[2]))
+
+
+if __name__ == '__main__':
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    options = MRApproximateTotals(args=sys.argv[1:]).options
+    job_class = JOB_CLASSES[options.job]
+
+    if is_task_invocation(options):
+        # Run a single mapper/combiner/reducer task of the selected job
+        job_class.run()
+        sys.exit(0)
+
+    # The input files are replaced by a block manifest for block sampling; everything else is passed on to the job
+    input_paths = options.args
+    # (run_job() appends the sampling options, which override any given here)
+    job_args = [arg for arg in sys.argv[1:len(sys.argv) - len(input_paths)] if arg != '--verify']
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        approximate = run_job(job_class, job_args, input_paths, options.sample_mode, options.sample_fraction,
+                              options.block_size, options.seed, temp_dir)
+
+        # Every block of the input, which makes the estimator exact
+        exact = None
+        comparison = None
+        if options.verify:
+            exact = run_job(job_class, job_args, input_paths, 'block', 1.0, options.block_size, options.seed, temp_dir)
+            comparison = compare_with_exact(approximate[0], exact[0])
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Print the estimated totals (the largest ones for word counts) and the sampled top K
+    results = approximate[0]
+    totals = sorted(((key[1], value) for key, value in results.items() if key[0] == 'total'), key=lambda kv: -kv[1][0])
+    if options.job == 'word-count':
+        totals = totals[:options.top_k]
+    for metric, (estimate, half_width) in totals:
+        print(metric, format_estimate(estimate, half_width))
+    for key, (score, _) in sorted(((k, v) for k, v in results.items() if k[0] == 'top'), key=lambda kv: -kv[1][0]):
+        print('Sampled top salary:', key[1], score)
+
+    # Save the performance metrics results
+    save_result(options, approximate, exact, comparison, input_filename)
@@ -0,0 +1,351 @@
+'''
+New Experiment 13: Packing Small Files into Combined Input Splits:
+The Wikipedia dump is split into chunks for test runs, and a directory of thousands of small chunk files gives the local runner
+one mapper task (and one interpreter startup) per file, which is the overhead Duplicated Experiment 1 measures.
+With --combine-input the local runner packs many small files into splits of up to --combined-split-size bytes (like Hadoop's
+CombineFileInputFormat). Files are taken in the order of their physical location on disk (FIEMAP, falling back to the inode
+number), so files that are close together on disk end up in the same split and are read sequentially. Each combined split comes
+with an index of the files it holds, and MRCombinedInputJob keeps self.input_file pointing at the file of the current line, so
+a mapper can still tell its files apart. With --benchmark a synthetic directory of --num-chunks small chunk files is generated
+from the input and the job is run with and without combined splits.
+
+Input: A directory of small text files, or a text file to generate chunks from with --benchmark (Eg. Tutorial_1_2_Input_1.txt)
+Output : Total chars, words, lines and files with the largest file, and the mapper tasks and execution time of each mode
+
+'''
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+from mrjob.local import LocalMRJobRunner
+from mrjob.compat import jobconf_from_env
+from mrjob.cat import is_compressed
+from collections import deque
+import shutil
+import struct
+import tempfile
+import time
+import psutil
+import datetime
+import os
+import sys
+
+# fcntl is Unix only; on Windows files are ordered by inode (file index) alone
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl to map the logical blocks of a file to physical blocks (linux/fs.h)
+FS_IOC_FIEMAP = 0xC020660B
+
+# Jobconf (and environment) variable with the path of a combined split's file index
+INPUT_INDEX_JOBCONF = 'mapreduce.map.input.files.index'
+
+
+def physical_offset(path):
+    """
+    Physical byte offset of the first extent of a file, or None if the filesystem can't tell (or the file is empty,
+    or fcntl is not available).
+
+    :param path: Path of the file.
+
+    :return: The offset.
+    """
+    if fcntl is None:
+        return None
+
+    # struct fiemap asking for a single extent, followed by room for one struct fiemap_extent
+    request = bytearray(struct.pack('=QQLLLL', 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0) + b'\0' * 56)
+    try:
+        with open(path, 'rb') as f:
+            fcntl.ioctl(f.fileno(), FS_IOC_FIEMAP, request)
+    except OSError:
+        return None
+    mapped_extents = struct.unpack_from('=L', request, 20)[0]
+    if not mapped_extents:
+        return None
+    return struct.unpack_from('=Q', request, 32 + 8)[0]
+
+
+def disk_order_key(path):
+    """Sort key putting files in the order they are laid out on disk."""
+    stat = os.stat(path)
+    offset = physical_offset(path)
+    if offset is None:
+        # Inodes are allocated close to the blocks of their directory, so they are the next best guess
+        return stat.st_dev, 1, stat.st_ino
+    return stat.st_dev, 0, offset
+
+
+def pack_files(paths, split_size):
+    """
+    Group files into combined splits of up to split_size bytes, in disk order.
+    A file of split_size bytes or more gets a split of its own.
+
+    :param paths: Paths of the input files.
+    :param split_size: Target size of a split in bytes.
+
+    :return: A list of splits, each a list of paths.
+    """
+    splits = []
+    current, current_size = [], 0
+    for path in sorted(paths, key=disk_order_key):
+        size = os.path.getsize(path)
+        if current and current_size + size > split_size:
+            splits.append(current)
+            current, current_size = [], 0
+        current.append(path)
+        current_size += size
+    if current:
+        splits.append(current)
+    return splits
+
+
+class SplitPerFileLocalMRJobRunner(LocalMRJobRunner):
+    """Local runner that gives every input file a single split of its own, however large, as the baseline for combined splits."""
+
+    def _pick_mapper_split_size(self, input_paths, step_num):
+        # The default splits files larger than total size / (2 * cores) across several tasks
+        return sys.maxsize
+
+
+class CombinedInputLocalMRJobRunner(LocalMRJobRunner):
+    """Local runner that packs small input files into combined splits, each with an index of the files it holds."""
+
+    combined_split_size = 64 * 1024 * 1024
+
+    def _split_mapper_input(self, input_paths, step_num):
+        input_paths = list(input_paths)
+        if step_num > 0 or self._uses_input_manifest() or any(is_compressed(path) for path in input_paths):
+            # Manifests, compressed inputs and the output of earlier steps keep the default handling
+            return super(CombinedInputLocalMRJobRunner, self)._split_mapper_input(input_paths, step_num)
+
+        results = []
+        for task_num, paths in enumerate(pack_files(input_paths, self.combined_split_size)):
+            dest = self._task_input_path('mapper', step_num, task_num)
+            self.fs.mkdir(os.path.dirname(dest))
+            index_path = dest + '.files'
+
+            length = 0
+            with open(dest, 'wb') as out, open(index_path, 'w') as index:
+                for path in paths:
+                    with open(path, 'rb') as src:
+                        data = src.read()
+                    if data and not data.endswith(b'\n'):
+                        # Keep the last line of a file from running into the first line of the next
+                        data += b'\n'
+                    out.write(data)
+                    length += len(data)
+                    index.write('{}\t{}\n'.format(data.count(b'\n'), os.path.abspath(path)))
+
+            results.append(dict(file=paths[0], start=0, length=length, index=index_path))
+
+        return results
+
+    def _simulate_jobconf_for_step(self, task_type, step_num, task_num, map_split=None):
+        j = super(CombinedInputLocalMRJobRunner, self)._simulate_jobconf_for_step(
+            task_type, step_num, task_num, map_split)
+        if map_split and 'index' in map_split:
+            j[INPUT_INDEX_JOBCONF] = map_split['index']
+        return j
+
+
+class MRCombinedInputJob(MRJob):
+    """
+    Base class for jobs that may read combined splits. Define mapper, combiner and reducer as usual;
+    self.input_file is the path of the file the current mapper line comes from.
+    """
+
+    def configure_args(self):
+        super(MRCombinedInputJob, self).configure_args()
+        self.add_passthru_arg('--combine-input', action='store_true', default=False,
+                              help="Pack small input files into combined splits with -r local")
+        self.add_passthru_arg('--combined-split-size', type=int, default=64 * 1024 * 1024,
+                              help="Target size of a combined split in bytes")
+        self.add_passthru_arg('--num-chunks', type=int, default=10000, help="Number of chunk files generated by --benchmark")
+        self.add_passthru_arg('--benchmark', action='store_true', default=False,
+                              help="Generate a directory of small chunks from the input and run with and without combined splits")
+
+    def _runner_class(self):
+        # Swap in the combining (or one split per file) local runner; other runners are left as they are
+        if self.options.runner == 'local':
+            if self.options.combine_input:
+                CombinedInputLocalMRJobRunner.combined_split_size = self.options.combined_split_size
+                return CombinedInputLocalMRJobRunner
+            return SplitPerFileLocalMRJobRunner
+        return super(MRCombinedInputJob, self)._runner_class()
+
+    def steps(self):
+        kwargs = {}
+        for name in ('mapper_final', 'combiner', 'reducer'):
+            if getattr(type(self), name) is not getattr(MRJob, name):
+                kwargs[name] = getattr(self, name)
+        return [MRStep(mapper_init=self.mapper_init_input_files, mapper=self.mapper_track_input_file, **kwargs)]
+
+    def mapper_init_input_files(self):
+        # (number of lines, path) of every file of the split, in the order they were packed
+        self.input_files = deque()
+        self.lines_left = 0
+        index_path = jobconf_from_env(INPUT_INDEX_JOBCONF, None)
+        if index_path:
+            with open(index_path) as f:
+                for line in f:
+                    num_lines, path = line.rstrip('\n').split('\t', 1)
+                    self.input_files.append((int(num_lines), path))
+            self.input_file = None
+        else:
+            # A plain split of a single file
+            self.input_file = jobconf_from_env('mapreduce.map.input.file', '').replace('file://', '', 1)
+            self.lines_left = float('inf')
+        self.mapper_init()
+
+    def mapper_track_input_file(self, key, value):
+        while not self.lines_left and self.input_files:
+            self.lines_left, self.input_file = self.input_files.popleft()
+        self.lines_left -= 1
+        return self.mapper(key, value) or ()
+
+    def mapper_init(self):
+        pass
+
+
+class MRChunkWordCount(MRCombinedInputJob):
+    # Tutorial 1's totals, plus the number of files and the largest file, which need the file of every line
+
+    def mapper_init(self):
+        self.words_per_file = {}
+
+    def mapper(self, _, line):
+        words = len(line.split())
+        self.words_per_file[self.input_file] = self.words_per_file.get(self.input_file, 0) + words
+        yield "Total chars count: ", len(line)
+        yield "Total words count: ", words
+        yield "Total lines count: ", 1
+
+    def mapper_final(self):
+        # With -r local both runners above give each file to exactly one mapper task, so the per task file counts add up
+        yield "Total files count: ", len(self.words_per_file)
+        if self.words_per_file:
+            path, words = max(self.words_per_file.items(), key=lambda item: (item[1], item[0]))
+            yield "Largest file (words): ", [words, os.path.basename(path)]
+
+    def reducer(self, key, values):
+        if key == "Largest file (words): ":
+            yield key, max(values)
+        else:
+            yield key, sum(values)
+
+
+def write_chunks(input_filename, chunk_dir, num_chunks):
+    """
+    Cut a text file into num_chunks small files (cycling through the text if it is short), like the chunked dump.
+
+    :return: Total size of the chunks in bytes.
+    """
+    with open(input_filename, 'rb') as f:
+        data = f.read()
+    # Chunks end on a line or word boundary and are about 1/num_chunks of the text (at least 256 bytes)
+    chunk_size = max(len(data) // num_chunks, 256)
+    total, start = 0, 0
+    for i in range(num_chunks):
+        if start >= len(data):
+            start = 0
+        end = min(start + chunk_size, len(data))
+        boundary = max(data.rfind(b'\n', start, end), data.rfind(b' ', start, end))
+        if end < len(data) and boundary > start:
+            end = boundary + 1
+        with open(os.path.join(chunk_dir, 'chunk-%05d.txt' % i), 'wb') as out:
+            out.write(data[start:end])
+        total += end - start
+        start = end
+    return total
+
+
+def run_job(job_args):
+    """Run the job, returning its output, number of mapper tasks and execution time."""
+    job = MRChunkWordCount(args=job_args)
+    start_time = time.time()
+    with job.make_runner() as runner:
+        runner.run()
+        output = dict(job.parse_output(runner.cat_output()))
+        mapper_tasks = len(os.listdir(os.path.join(runner._step_dir(0), 'mapper')))
+    return output, mapper_tasks, time.time() - start_time
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+# Function to monitor system resources
+def monitor_resources():
+    memory_info = psutil.virtual_memory()
+    memory_usage = memory_info.used / (1024 ** 2)  # Convert to MB
+    cpu_usage = psutil.cpu_percent(interval=1)  # CPU usage in percentage
+    return memory_usage, cpu_usage
+
+#function to save result
+def save_result(runs, num_files, total_size, memory_usage_before, memory_usage_after, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename.rstrip(os.sep)))[0]
+    filename = os.path.join("results", "New Experiment", "13", f"New_Experiment_13_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        f.write("Input files: {} ({} bytes)\n".format(num_files, total_size))
+        for mode, (output, mapper_tasks, execution_time) in runs.items():
+            f.write("[{}] Mapper tasks: {}\n".format(mode, mapper_tasks))
+            f.write("[{}] Execution time: {:.4f} seconds\n".format(mode, execution_time))
+        f.write("Memory usage before job: {:.2f} MB\n".format(memory_usage_before))
+        f.write("Memory usage after job: {:.2f} MB\n".format(memory_usage_after))
+        if len(runs) > 1:
+            outputs = [run[0] for run in runs.values()]
+            f.write("Outputs match: {}\n".format(all(output == outputs[0] for output in outputs)))
+
+
+if __name__ == '__main__':
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    options = MRChunkWordCount(args=sys.argv[1:]).options
+
+    if is_task_invocation(options):
+        # Run a single mapper/reducer task
+        MRChunkWordCount.run()
+        sys.exit(0)
+
+    job_args = [arg for arg in sys.argv[1:-1] if arg not in ('--benchmark', '--combine-input')]
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        input_path = input_filename
+        if options.benchmark:
+            input_path = os.path.join(temp_dir, 'chunks')
+            os.makedirs(input_path)
+            write_chunks(input_filename, input_path, options.num_chunks)
+
+        if os.path.isdir(input_path):
+            input_files = [os.path.join(input_path, name) for name in os.listdir(input_path)]
+        else:
+            input_files = [input_path]
+        total_size = sum(os.path.getsize(path) for path in input_files)
+
+        memory_usage_before, cpu_usage_before = monitor_resources()
+
+        # Run with combined splits, and with one whole file per split too when benchmarking
+        runs = {}
+        runs['combined splits'] = run_job(job_args + ['--combine-input', input_path])
+        if options.benchmark:
+            runs['one split per file'] = run_job(job_args + [input_path])
+
+        memory_usage_after, cpu_usage_after = monitor_resources()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Print the job output
+    for key, value in sorted(runs['combined splits'][0].items()):
+        print(key, value)
+
+    # Save the performance metrics results
+    save_result(runs, len(input_files), total_size, memory_usage_before, memory_usage_after, input_filename)
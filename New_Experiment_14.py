@@ -0,0 +1,231 @@
+'''
+New Experiment 14: Word Co-occurrence Counting with the Pairs and Stripes Patterns:
+The next analysis after Tutorial 2 is how often two words occur within --window words of each other on a line, using Tutorial 2's
+WORD_RE tokenization. Two patterns are compared:
+    - pairs: the mapper emits ((word, neighbour), 1) for every co-occurrence, and the combiner sums the counts per pair.
+    - stripes: the mapper keeps one associative array (stripe) of neighbour counts per word and emits (word, stripe);
+      the combiner and reducer merge the stripes. The mapper flushes its stripes whenever they hold more than --stripe-memory
+      entries, so its memory stays bounded.
+Both jobs output the (word, neighbour) pairs seen at least --min-count times. With --benchmark both patterns are run and the
+bytes and records shuffled to the reducers and the wall time of each are reported.
+
+Input: Varied input text files (Eg. project_gutenberg_eBook_emma.txt, Tutorial_1_2_Input_1.txt)
+Output : Co-occurrence counts, with the shuffle bytes, shuffle records and execution time of each pattern
+
+'''
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+from Tutorial_2_frequent_word_count import WORD_RE
+import glob
+import time
+import psutil
+import datetime
+import os
+import sys
+
+
+def configure_cooccurrence_args(job):
+    """Arguments shared by both patterns."""
+    job.add_passthru_arg('--pattern', choices=('pairs', 'stripes'), default='stripes', help="Co-occurrence pattern to use")
+    job.add_passthru_arg('--window', type=int, default=2, help="Largest distance (in words) between two co-occurring words")
+    job.add_passthru_arg('--min-count', type=int, default=2, help="Smallest co-occurrence count to output")
+    job.add_passthru_arg('--stripe-memory', type=int, default=500000,
+                         help="Largest number of stripe entries a mapper holds before flushing them")
+    job.add_passthru_arg('--benchmark', action='store_true', default=False, help="Run and compare both patterns")
+
+
+def neighbours(line, window):
+    """
+    Yield every (word, neighbour) pair of a line, where the neighbour is at most window words before or after the word.
+
+    :param line: The input line.
+    :param window: Largest distance between the two words.
+    """
+    words = [word.lower() for word in WORD_RE.findall(line)]
+    for i, word in enumerate(words):
+        for j in range(max(0, i - window), min(len(words), i + window + 1)):
+            if j != i:
+                yield word, words[j]
+
+
+#Pairs Pattern Class
+class MRCooccurrencePairs(MRJob):
+
+    # Ship the module WORD_RE comes from to the tasks' working directory
+    FILES = ['Tutorial_2_frequent_word_count.py']
+
+    def configure_args(self):
+        super(MRCooccurrencePairs, self).configure_args()
+        configure_cooccurrence_args(self)
+
+    def steps(self):
+        return [
+            MRStep(mapper=self.mapper,
+                   combiner=self.combiner,
+                   reducer=self.reducer)
+        ]
+
+    def mapper(self, _, line):
+        for word, neighbour in neighbours(line, self.options.window):
+            yield (word, neighbour), 1
+
+    def combiner(self, pair, counts):
+        yield pair, sum(counts)
+
+    def reducer(self, pair, counts):
+        count = sum(counts)
+        if count >= self.options.min_count:
+            yield pair, count
+
+
+#Stripes Pattern Class
+class MRCooccurrenceStripes(MRJob):
+
+    # Ship the module WORD_RE comes from to the tasks' working directory
+    FILES = ['Tutorial_2_frequent_word_count.py']
+
+    def configure_args(self):
+        super(MRCooccurrenceStripes, self).configure_args()
+        configure_cooccurrence_args(self)
+
+    def steps(self):
+        return [
+            MRStep(mapper_init=self.mapper_init,
+                   mapper=self.mapper,
+                   mapper_final=self.mapper_final,
+                   combiner=self.combiner,
+                   reducer=self.reducer)
+        ]
+
+    def mapper_init(self):
+        self.stripes = {}
+        self.entries = 0
+
+    def flush_stripes(self):
+        for word, stripe in self.stripes.items():
+            yield word, stripe
+        self.increment_counter('stripes', 'flushes', 1)
+        self.stripes = {}
+        self.entries = 0
+
+    def mapper(self, _, line):
+        for word, neighbour in neighbours(line, self.options.window):
+            stripe = self.stripes.setdefault(word, {})
+            if neighbour not in stripe:
+                stripe[neighbour] = 0
+                self.entries += 1
+            stripe[neighbour] += 1
+
+        # Bound the memory of the in-mapper stripes
+        if self.entries > self.options.stripe_memory:
+            yield from self.flush_stripes()
+
+    def mapper_final(self):
+        if self.stripes:
+            yield from self.flush_stripes()
+
+    def merge_stripes(self, stripes):
+        merged = {}
+        for stripe in stripes:
+            for neighbour, count in stripe.items():
+                merged[neighbour] = merged.get(neighbour, 0) + count
+        return merged
+
+    def combiner(self, word, stripes):
+        yield word, self.merge_stripes(stripes)
+
+    def reducer(self, word, stripes):
+        # Output the same (word, neighbour) records as the pairs pattern
+        for neighbour, count in sorted(self.merge_stripes(stripes).items()):
+            if count >= self.options.min_count:
+                yield (word, neighbour), count
+
+
+JOB_CLASSES = {
+    'pairs': MRCooccurrencePairs,
+    'stripes': MRCooccurrenceStripes,
+}
+
+
+def run_job(pattern, job_args):
+    """Run one pattern, returning its output, the bytes and records shuffled to the reducers and the execution time."""
+    job = JOB_CLASSES[pattern](args=job_args + ['--pattern', pattern])
+    start_time = time.time()
+    with job.make_runner() as runner:
+        runner.run()
+        output = {tuple(pair): count for pair, count in job.parse_output(runner.cat_output())}
+
+        # The sorted reducer inputs hold exactly what was shuffled (the combiners' output)
+        shuffle_bytes, shuffle_records = 0, 0
+        for path in glob.glob(os.path.join(runner._step_dir(0), 'reducer', '*', 'input')):
+            shuffle_bytes += os.path.getsize(path)
+            with open(path, 'rb') as f:
+                shuffle_records += sum(1 for _ in f)
+    return output, shuffle_bytes, shuffle_records, time.time() - start_time
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+# Function to monitor system resources
+def monitor_resources():
+    memory_info = psutil.virtual_memory()
+    memory_usage = memory_info.used / (1024 ** 2)  # Convert to MB
+    cpu_usage = psutil.cpu_percent(interval=1)  # CPU usage in percentage
+    return memory_usage, cpu_usage
+
+#function to save result
+def save_result(runs, options, memory_usage_before, memory_usage_after, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "14", f"New_Experiment_14_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        f.write("Window: {}, minimum count: {}, stripe memory: {} entries\n".format(
+            options.window, options.min_count, options.stripe_memory))
+        for pattern, (output, shuffle_bytes, shuffle_records, execution_time) in runs.items():
+            f.write("[{}] Co-occurring pairs output: {}\n".format(pattern, len(output)))
+            f.write("[{}] Shuffle bytes: {}\n".format(pattern, shuffle_bytes))
+            f.write("[{}] Shuffle records: {}\n".format(pattern, shuffle_records))
+            f.write("[{}] Execution time: {:.4f} seconds\n".format(pattern, execution_time))
+        f.write("Memory usage before job: {:.2f} MB\n".format(memory_usage_before))
+        f.write("Memory usage after job: {:.2f} MB\n".format(memory_usage_after))
+        if len(runs) > 1:
+            f.write("Outputs match: {}\n".format(runs['pairs'][0] == runs['stripes'][0]))
+
+
+if __name__ == '__main__':
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    options = MRCooccurrenceStripes(args=sys.argv[1:]).options
+
+    if is_task_invocation(options):
+        # Run a single mapper/combiner/reducer task of the selected pattern
+        JOB_CLASSES[options.pattern].run()
+        sys.exit(0)
+
+    job_args = [arg for arg in sys.argv[1:] if arg != '--benchmark']
+
+    memory_usage_before, cpu_usage_before = monitor_resources()
+
+    # Run the chosen pattern, or both of them when benchmarking
+    patterns = ['pairs', 'stripes'] if options.benchmark else [options.pattern]
+    runs = {}
+    for pattern in patterns:
+        runs[pattern] = run_job(pattern, job_args)
+
+    memory_usage_after, cpu_usage_after = monitor_resources()
+
+    # Print the most frequent co-occurrences
+    output = runs[patterns[0]][0]
+    for pair, count in sorted(output.items(), key=lambda item: -item[1])[:20]:
+        print(pair, count)
+
+    # Save the performance metrics results
+    save_result(runs, options, memory_usage_before, memory_usage_after, input_filename)
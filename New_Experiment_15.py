@@ -0,0 +1,229 @@
+'''
+New Experiment 15: HyperLogLog Distinct Vocabulary Count in the Word Count Job:
+Tutorial 1's MRWordFrequencyCount reports the total chars, words and lines but not the vocabulary size, which today needs a Tutorial 2
+style shuffle of every distinct word. With --distinct-words each mapper also keeps a HyperLogLog sketch of the (Tutorial 2 style,
+lower cased) words it sees and emits the sketch once in mapper_final; the combiner and reducer merge sketches by taking the register
+maximum and the reducer reports the estimated number of distinct words. A sketch has 2^--hll-precision one byte registers
+(or as many as fit in --hll-memory bytes), so each task shuffles a few KB instead of one record per distinct word, and the
+standard error of the estimate is about 1.04 / sqrt(registers). With --verify the exact vocabulary size is counted too.
+
+Input: Varied input text files (Eg. demo_input.txt, project_gutenberg_eBook_emma.txt, Tutorial_1_2_Input_1.txt)
+Output : Total chars, words and lines count with the estimated distinct word count, sketch size and execution time
+
+'''
+
+from Tutorial_1_word_count import MRWordFrequencyCount
+from Tutorial_2_frequent_word_count import WORD_RE
+import base64
+import hashlib
+import math
+import time
+import psutil
+import datetime
+import os
+import sys
+
+DISTINCT_WORDS_KEY = "Distinct words count (estimated): "
+
+
+class HyperLogLog(object):
+    """
+    HyperLogLog sketch with 2^precision one byte registers and a 64 bit hash.
+
+    Each item is hashed; the first `precision` bits of the hash pick a register, which keeps the longest run of leading
+    zeros (plus one) seen in the remaining bits. Sketches of the same precision merge by taking the register maximum.
+    """
+
+    def __init__(self, precision=12, registers=None):
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be between 4 and 18, got %d' % precision)
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.num_registers)
+
+    def add(self, item):
+        h = int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('cannot merge sketches of precision %d and %d' % (self.precision, other.precision))
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        """
+        Estimate the number of distinct items added.
+
+        :return: The estimate, with linear counting for small cardinalities.
+        """
+        m = self.num_registers
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(float(m) / zeros)
+        return raw
+
+    def standard_error(self):
+        return 1.04 / math.sqrt(self.num_registers)
+
+    def to_string(self):
+        """Encode the sketch as "precision:base64 registers" for the JSON protocol."""
+        return '%d:%s' % (self.precision, base64.b64encode(bytes(self.registers)).decode('ascii'))
+
+    @classmethod
+    def from_string(cls, s):
+        precision, registers = s.split(':', 1)
+        return cls(int(precision), base64.b64decode(registers))
+
+
+def precision_for_memory(memory):
+    """Largest precision whose registers fit in the given number of bytes."""
+    return max(4, min(18, int(math.log2(memory))))
+
+
+class MRWordFrequencyCountWithHLL(MRWordFrequencyCount):
+
+    # Ship the modules the job is built on to the tasks' working directory
+    FILES = ['Tutorial_1_word_count.py', 'Tutorial_2_frequent_word_count.py']
+
+    def configure_args(self):
+        super(MRWordFrequencyCountWithHLL, self).configure_args()
+        self.add_passthru_arg('--distinct-words', action='store_true', default=False,
+                              help="Also estimate the number of distinct words with a HyperLogLog sketch")
+        self.add_passthru_arg('--hll-precision', type=int, default=12,
+                              help="Sketch precision p; the sketch has 2^p registers of one byte")
+        self.add_passthru_arg('--hll-memory', type=int, default=None,
+                              help="Sketch memory in bytes (overrides --hll-precision)")
+        self.add_passthru_arg('--verify', action='store_true', default=False,
+                              help="Count the exact number of distinct words too")
+
+    def precision(self):
+        if self.options.hll_memory:
+            return precision_for_memory(self.options.hll_memory)
+        return self.options.hll_precision
+
+    def mapper_init(self):
+        self.sketch = HyperLogLog(self.precision()) if self.options.distinct_words else None
+
+    def mapper(self, key, line):
+        yield from super(MRWordFrequencyCountWithHLL, self).mapper(key, line)
+        if self.sketch is not None:
+            for word in WORD_RE.findall(line):
+                self.sketch.add(word.lower())
+
+    def mapper_final(self):
+        # One sketch per mapper task instead of one record per distinct word
+        if self.sketch is not None:
+            encoded = self.sketch.to_string()
+            self.increment_counter('hll', 'sketch bytes emitted', len(encoded))
+            yield DISTINCT_WORDS_KEY, encoded
+
+    def merge_sketches(self, encoded_sketches):
+        merged = None
+        for encoded in encoded_sketches:
+            sketch = HyperLogLog.from_string(encoded)
+            if merged is None:
+                merged = sketch
+            else:
+                merged.merge(sketch)
+        return merged
+
+    def combiner(self, key, values):
+        if key == DISTINCT_WORDS_KEY:
+            yield key, self.merge_sketches(values).to_string()
+        else:
+            yield key, sum(values)
+
+    def reducer(self, key, values):
+        if key == DISTINCT_WORDS_KEY:
+            yield key, int(round(self.merge_sketches(values).estimate()))
+        else:
+            yield from super(MRWordFrequencyCountWithHLL, self).reducer(key, values)
+
+
+def exact_distinct_words(input_filename):
+    """Count the distinct words of the input in this process, for comparison."""
+    words = set()
+    with open(input_filename, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            words.update(word.lower() for word in WORD_RE.findall(line))
+    return len(words)
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+# Function to monitor system resources
+def monitor_resources():
+    memory_info = psutil.virtual_memory()
+    memory_usage = memory_info.used / (1024 ** 2)  # Convert to MB
+    cpu_usage = psutil.cpu_percent(interval=1)  # CPU usage in percentage
+    return memory_usage, cpu_usage
+
+#function to save result
+def save_result(execution_time, results, precision, sketch_bytes, exact, memory_usage_before, memory_usage_after, cpu_usage, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "15", f"New_Experiment_15_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        f.write("Execution time: {:.4f} seconds\n".format(execution_time))
+        for key, value in sorted(results.items()):
+            f.write("{}{}\n".format(key, value))
+        if DISTINCT_WORDS_KEY in results:
+            sketch = HyperLogLog(precision)
+            f.write("Sketch precision: {} ({} registers, {} bytes)\n".format(precision, sketch.num_registers, sketch.num_registers))
+            f.write("Expected standard error: {:.2%}\n".format(sketch.standard_error()))
+            f.write("Sketch bytes shuffled by mappers: {}\n".format(sketch_bytes))
+        if exact is not None:
+            estimate = results.get(DISTINCT_WORDS_KEY, 0)
+            f.write("Exact distinct words count: {}\n".format(exact))
+            f.write("Relative error: {:.2%}\n".format(abs(estimate - exact) / exact if exact else 0.0))
+        f.write("Memory usage before job: {:.2f} MB\n".format(memory_usage_before))
+        f.write("Memory usage after job: {:.2f} MB\n".format(memory_usage_after))
+        f.write("Average CPU Utilization: {}%\n".format(cpu_usage))
+
+
+if __name__ == '__main__':
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    job = MRWordFrequencyCountWithHLL(args=sys.argv[1:])
+
+    if is_task_invocation(job.options):
+        # Run a single mapper/combiner/reducer task
+        MRWordFrequencyCountWithHLL.run()
+        sys.exit(0)
+
+    memory_usage_before, cpu_usage_before = monitor_resources()
+
+    # Run the job
+    start_time = time.time()
+    with job.make_runner() as runner:
+        runner.run()
+        results = dict(job.parse_output(runner.cat_output()))
+        sketch_bytes = sum(step_counters.get('hll', {}).get('sketch bytes emitted', 0) for step_counters in runner.counters())
+    execution_time = time.time() - start_time
+
+    memory_usage_after, cpu_usage_after = monitor_resources()
+    cpu_usage = (cpu_usage_before + cpu_usage_after) / 2
+
+    exact = exact_distinct_words(input_filename) if job.options.verify else None
+
+    # Print the job output
+    for key, value in sorted(results.items()):
+        print(key, value)
+
+    # Save the performance metrics results
+    save_result(execution_time, results, job.precision(), sketch_bytes, exact,
+                memory_usage_before, memory_usage_after, cpu_usage, input_filename)
@@ -0,0 +1,443 @@
+'''
+New Experiment 16: Reusing Materialized Step Outputs across Jobs with a Shared First Step:
+MRMostUsedWord, MRMostUsedWordWithCustomPartitioner and MRPartitionEffectivenessExperiment all start with the same expensive
+tokenize -> count step, and only their later steps differ. Here the jobs run in NE8's in-process executor and the output of every
+step is materialized in --cache-dir under a fingerprint of
+    - the code of the step's functions (bytecode, constants and names, without docstrings or line numbers) and of the job
+      methods, class attributes (Eg. TOP_N), module level functions, regexes and constants they use,
+    - the job options the step's code reads, and
+    - the identity of its input (path, size and modification time of the input files, or the fingerprint of the previous step).
+The combined output of the map side (mapper + combiner, sorted by key) is materialized under its own fingerprint as well.
+A later job whose step has the same fingerprint reads the saved output instead of recomputing it, and a job whose step only shares
+the map side (Eg. the two partitioner jobs, which differ in their step 1 reducer) reads the saved counts and only runs its reducer.
+A step whose code uses a value that can't be fingerprinted (Eg. an arbitrary object) is always recomputed, as are the steps after it.
+MRTopWords and MRVocabularyStats are two more second-step analyses over MRMostUsedWord's counted corpus.
+
+Input: Varied input text files (Eg. demo_input.txt, project_gutenberg_eBook_emma.txt, Tutorial_1_2_Input_1.txt)
+Output : Output of every job, with the steps that were reused and the time saved
+
+'''
+
+from Tutorial_2_frequent_word_count import MRMostUsedWord
+from New_Experiment_8 import JOB_CLASSES as TWO_STEP_JOB_CLASSES, PipelinedStepExecutor, sort_key
+import mrjob
+from mrjob.step import MRStep, _MAPPER_FUNCS, _COMBINER_FUNCS, _REDUCER_FUNCS
+from operator import itemgetter
+import argparse
+import hashlib
+import heapq
+import inspect
+import json
+import re
+import shutil
+import tempfile
+import time
+import datetime
+import os
+import sys
+
+DEFAULT_CACHE_DIR = '.step_cache'
+
+# Values that are fingerprinted by their repr (containers are fingerprinted item by item)
+FINGERPRINTED_VALUE_TYPES = (type(None), int, float, complex, str, bytes, bool)
+
+# Code of these packages is identified by its name (and the mrjob version) instead of its bytecode
+LIBRARY_PACKAGES = {'mrjob', 'builtins'} | set(sys.stdlib_module_names)
+
+_MISSING = object()
+
+
+class NotFingerprintableError(ValueError):
+    """Raised when step code uses a value whose fingerprint can't tell when it changes; such steps are not cached."""
+
+
+class MRTopWords(MRMostUsedWord):
+    # A different second step over the same word counts: the ten most used words
+
+    TOP_N = 10
+
+    def steps(self):
+        return [
+            super(MRTopWords, self).steps()[0],
+            MRStep(reducer=self.reducer_find_top_words)
+        ]
+
+    def reducer_find_top_words(self, _, word_count_pairs):
+        for count, word in heapq.nlargest(self.TOP_N, word_count_pairs):
+            yield word, count
+
+
+class MRVocabularyStats(MRMostUsedWord):
+    # A different second step over the same word counts: vocabulary size and words used only once
+
+    def steps(self):
+        return [
+            super(MRVocabularyStats, self).steps()[0],
+            MRStep(reducer=self.reducer_vocabulary_stats)
+        ]
+
+    def reducer_vocabulary_stats(self, _, word_count_pairs):
+        distinct, total, once = 0, 0, 0
+        for count, word in word_count_pairs:
+            distinct += 1
+            total += count
+            once += count == 1
+        yield "Vocabulary", {"Distinct Words": distinct, "Total Words": total, "Words Used Once": once}
+
+
+JOB_CLASSES = dict(TWO_STEP_JOB_CLASSES)
+JOB_CLASSES.update({
+    'top-words': MRTopWords,
+    'vocabulary-stats': MRVocabularyStats,
+})
+
+
+def is_library_object(value):
+    """Whether a function or class comes from mrjob or the standard library rather than from this repository."""
+    module = getattr(value, '__module__', None)
+    return isinstance(module, str) and module.partition('.')[0] in LIBRARY_PACKAGES
+
+
+def value_fingerprint(name, value, job_class, names, seen):
+    """
+    Describe a value used by step code: functions and classes of this repository by their code, library functions, classes and
+    modules by their name, regexes by their pattern and flags, and constants (Eg. TOP_N) and containers of them by their repr.
+
+    :param name: Name the code uses for the value, for the error message.
+    :param value: The value (a class attribute of the job or a module global).
+    :param job_class: Class of the job, to look up the methods the code calls.
+    :param names: Set collecting every name used, to find the options the code reads.
+    :param seen: Code objects and classes already described.
+
+    :return: A JSON serializable description.
+    """
+    if isinstance(value, (staticmethod, classmethod)):
+        value = value.__func__
+    if isinstance(value, property):
+        return ['property', [value_fingerprint(name, func, job_class, names, seen)
+                             for func in (value.fget, value.fset, value.fdel) if func is not None]]
+
+    if inspect.isfunction(value):
+        if is_library_object(value):
+            return ['library', value.__module__, value.__qualname__, mrjob.__version__]
+        return code_fingerprint(value.__code__, job_class, value.__globals__, names, seen, value.__doc__)
+    if inspect.ismodule(value):
+        return ['module', value.__name__]
+    if inspect.isbuiltin(value) or inspect.ismethoddescriptor(value):
+        return ['builtin', getattr(value, '__module__', None), value.__qualname__]
+    if inspect.isclass(value):
+        if is_library_object(value):
+            return ['class', value.__module__, value.__qualname__, mrjob.__version__]
+        if value in seen:
+            return value.__qualname__
+        seen.add(value)
+        # A class of this repository is described by everything it defines
+        return ['class', value.__qualname__, [base.__qualname__ for base in value.__mro__[1:]],
+                [[attr, value_fingerprint(attr, attr_value, job_class, names, seen)]
+                 for attr, attr_value in sorted(vars(value).items())
+                 if attr not in ('__dict__', '__weakref__', '__module__', '__doc__', '__qualname__')]]
+
+    if isinstance(value, re.Pattern):
+        return ['regex', value.pattern, value.flags]
+    if isinstance(value, FINGERPRINTED_VALUE_TYPES):
+        return repr(value)
+    if isinstance(value, (tuple, list)):
+        return [type(value).__name__, [value_fingerprint(name, item, job_class, names, seen) for item in value]]
+    if isinstance(value, (set, frozenset)):
+        return [type(value).__name__, sorted(repr(value_fingerprint(name, item, job_class, names, seen)) for item in value)]
+    if isinstance(value, dict):
+        return ['dict', sorted([repr(value_fingerprint(name, key, job_class, names, seen)),
+                                value_fingerprint(name, item, job_class, names, seen)] for key, item in value.items())]
+
+    raise NotFingerprintableError('%s (a %s) cannot be fingerprinted' % (name, type(value).__name__))
+
+
+def code_fingerprint(code, job_class, func_globals, names, seen, doc=None):
+    """
+    Describe a code object by what it does: its bytecode, constants (nested code objects included) and names,
+    but not its docstring, comments or line numbers. The job class attributes (methods and constants such as TOP_N)
+    and module globals (helper functions, regexes and constants) it uses are described along with it.
+
+    :param code: The code object.
+    :param job_class: Class of the job, to look up the methods and class attributes the code uses.
+    :param func_globals: Module globals of the function.
+    :param names: Set collecting every name used, to find the options the code reads.
+    :param seen: Code objects already described (methods calling each other).
+    :param doc: Docstring of the function, left out of its constants.
+
+    :return: A JSON serializable description.
+    :raises NotFingerprintableError: If the code uses a value that can't be fingerprinted.
+    """
+    if code in seen:
+        return code.co_name
+    seen.add(code)
+    names.update(code.co_names)
+
+    consts = list(code.co_consts)
+    if doc is not None and consts and consts[0] == doc:
+        consts = consts[1:]
+    parts = [code.co_code.hex(), code.co_names, [
+        code_fingerprint(const, job_class, func_globals, names, seen) if inspect.iscode(const) else repr(const)
+        for const in consts]]
+
+    # co_names mixes attribute names (self.TOP_N, word.lower) and globals; describe every one that resolves
+    for name in code.co_names:
+        value = inspect.getattr_static(job_class, name, _MISSING)
+        if value is _MISSING:
+            value = func_globals.get(name, _MISSING)
+        if value is not _MISSING:
+            parts.append([name, value_fingerprint(name, value, job_class, names, seen)])
+    return parts
+
+
+def step_fingerprint(job, step, func_names, input_identity):
+    """
+    Fingerprint one part of a step (the functions listed in func_names) run on the given input.
+
+    :param job: The job.
+    :param step: The MRStep.
+    :param func_names: Names of the step functions to include (Eg. the mapper and combiner functions).
+    :param input_identity: Fingerprint of the input.
+
+    :return: A hex digest.
+    :raises NotFingerprintableError: If the step's code uses a value that can't be fingerprinted.
+    """
+    names, seen = set(), set()
+    functions = []
+    for func_name in func_names:
+        func = step._steps.get(func_name)
+        if func is None:
+            continue
+        if isinstance(func, str):
+            # A command
+            functions.append([func_name, func])
+            continue
+        func = getattr(func, '__func__', func)
+        functions.append([func_name, code_fingerprint(func.__code__, type(job), func.__globals__, names, seen, func.__doc__)])
+
+    # Only the options the step's code reads (Eg. --num-reducers of the partitioner jobs)
+    options = {dest: getattr(job.options, dest, None) for dest in sorted(job._passthru_arg_dests) if dest in names}
+
+    description = {
+        'input': input_identity,
+        'functions': functions,
+        'options': options,
+        'jobconf': step._steps.get('jobconf'),
+        'internal protocol': job.INTERNAL_PROTOCOL.__name__,
+    }
+    return hashlib.sha1(json.dumps(description, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
+
+
+def input_identity(input_paths):
+    """Identify the input files by path, size and modification time."""
+    files = []
+    for path in input_paths:
+        stat = os.stat(path)
+        files.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return files
+
+
+class ReusingStepExecutor(PipelinedStepExecutor):
+    """
+    Runs the steps of a job one after the other in this process (see New Experiment 8), materializing the output of every
+    step and the combined map side output of every step in a cache directory, and reading them back instead of recomputing
+    them when a step with the same fingerprint runs again.
+    """
+
+    def __init__(self, job, cache_dir=DEFAULT_CACHE_DIR, memory_limit_mb=1024, temp_dir=None):
+        super(ReusingStepExecutor, self).__init__(job, memory_limit_mb, materialize=False, temp_dir=temp_dir)
+        self.cache_dir = cache_dir
+        self.report = []
+
+    def _cache_path(self, fingerprint):
+        return os.path.join(self.cache_dir, fingerprint + '.out')
+
+    def _fingerprint(self, step, func_names, identity, entry):
+        """
+        Fingerprint part of a step, or return None if it can't be cached, noting why in the step's report entry.
+
+        :param step: The MRStep.
+        :param func_names: Names of the step functions to include.
+        :param identity: Fingerprint of the input, None if the input itself could not be fingerprinted.
+        :param entry: Report entry of the step.
+        """
+        if identity is None:
+            entry.setdefault('not cached', 'its input is not cached')
+            return None
+        try:
+            return step_fingerprint(self.job, step, func_names, identity)
+        except NotFingerprintableError as e:
+            entry.setdefault('not cached', str(e))
+            return None
+
+    def _load(self, fingerprint):
+        """Read a materialized output back, returning (pairs, metadata), or None if there is none."""
+        if fingerprint is None:
+            return None
+        path = self._cache_path(fingerprint)
+        if not os.path.exists(path) or not os.path.exists(path + '.json'):
+            return None
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        with open(path, 'rb') as f:
+            pairs = [self.protocol.read(line.rstrip(b'\n')) for line in f]
+        return pairs, meta
+
+    def _save(self, fingerprint, pairs, meta):
+        """Materialize an output with the internal protocol; the metadata is written last, marking it complete."""
+        if fingerprint is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(fingerprint)
+        with open(path + '.tmp', 'wb') as f:
+            for key, value in pairs:
+                f.write(self.protocol.write(key, value) + b'\n')
+        os.replace(path + '.tmp', path)
+        with open(path + '.json.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.json.tmp', path + '.json')
+
+    def _map_and_combine(self, pairs, step, step_num):
+        """Run the map side of a step and return its output combined, sorted and grouped by key."""
+        grouped = self._group_in_memory(self.job.map_pairs(pairs, step_num), step, step_num)
+        if not step.has_explicit_combiner:
+            return list(grouped)
+
+        # Combining the whole map output at once keeps one record per key (Eg. one count per word)
+        combined = [(sort_key(key), key, value) for key, value in self.job.combine_pairs(grouped, step_num)]
+        combined.sort(key=itemgetter(0))
+        return list(self._regroup(combined))
+
+    def run(self, input_paths):
+        """
+        Run every step of the job, reusing materialized outputs where the fingerprints match.
+
+        :param input_paths: Paths of the input files.
+
+        :return: The (key, value) pairs output by the last step.
+        """
+        steps = self.job.steps()
+        identity = input_identity(input_paths)
+        pairs = None
+
+        for step_num, step in enumerate(steps):
+            start_time = time.time()
+            entry = {'step': step_num + 1, 'saved': 0.0}
+            fingerprint = self._fingerprint(step, _MAPPER_FUNCS + _COMBINER_FUNCS + _REDUCER_FUNCS, identity, entry)
+            entry['fingerprint'] = fingerprint[:12] if fingerprint else 'not cached'
+
+            cached = self._load(fingerprint)
+            if cached is not None:
+                output, meta = cached
+                entry['status'] = 'reused step output'
+                entry['saved'] = meta['seconds'] - (time.time() - start_time)
+            else:
+                if pairs is None:
+                    pairs = self._read_input(input_paths)
+                maps = step_num == 0 or step.has_explicit_mapper or step.has_explicit_combiner
+
+                if not step.has_explicit_reducer:
+                    output = list(self.job.map_pairs(pairs, step_num))
+                    entry['status'] = 'computed'
+                elif not maps:
+                    # Reducer only; the map side would just sort the previous step's output
+                    output = list(self.job.reduce_pairs(self._group_in_memory(pairs, step, step_num), step_num))
+                    entry['status'] = 'computed'
+                else:
+                    map_fingerprint = self._fingerprint(step, _MAPPER_FUNCS + _COMBINER_FUNCS, identity, entry)
+                    map_cached = self._load(map_fingerprint)
+                    if map_cached is not None:
+                        grouped, meta = map_cached
+                        entry['status'] = 'reused map output'
+                        entry['saved'] = meta['seconds'] - (time.time() - start_time)
+                    else:
+                        grouped = self._map_and_combine(pairs, step, step_num)
+                        self._save(map_fingerprint, grouped, {
+                            'job': type(self.job).__name__, 'step': step_num + 1, 'part': 'map output',
+                            'seconds': time.time() - start_time, 'records': len(grouped)})
+                        entry['status'] = 'computed'
+                    output = list(self.job.reduce_pairs(iter(grouped), step_num))
+
+                self._save(fingerprint, output, {
+                    'job': type(self.job).__name__, 'step': step_num + 1, 'part': 'step output',
+                    'seconds': time.time() - start_time + entry['saved'], 'records': len(output)})
+
+            if 'not cached' in entry:
+                entry['status'] += ' (not cached: %s)' % entry['not cached']
+            entry['seconds'] = time.time() - start_time
+            self.report.append(entry)
+
+            # The next step's input is identified by this step's fingerprint (None if this step is not cached)
+            identity = fingerprint
+            pairs = output
+
+        self._memory()
+        return output
+
+
+def run_executor(job_class, job_args, input_paths, cache_dir):
+    """Run a job with the reusing executor, returning its output, its step report and the execution time."""
+    job = job_class(args=job_args)
+    temp_dir = tempfile.mkdtemp()
+    try:
+        executor = ReusingStepExecutor(job, cache_dir, temp_dir=temp_dir)
+        start_time = time.time()
+        output = executor.run(input_paths)
+        execution_time = time.time() - start_time
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return output, executor.report, execution_time
+
+
+#function to save result
+def save_result(runs, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "16", f"New_Experiment_16_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        total_saved = 0.0
+        for name, (output, report, execution_time) in runs:
+            f.write("[{}] Execution time: {:.4f} seconds\n".format(name, execution_time))
+            for entry in report:
+                f.write("[{}] Step {} ({}): {}, {:.4f} seconds, time saved: {:.4f} seconds\n".format(
+                    name, entry['step'], entry['fingerprint'], entry['status'], entry['seconds'], entry['saved']))
+                total_saved += entry['saved']
+        f.write("Total time saved by reuse: {:.4f} seconds\n".format(total_saved))
+
+
+if __name__ == '__main__':
+
+    # Options of this experiment; everything else is passed on to the jobs
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--jobs', default='most-used-word,top-words,vocabulary-stats,custom-partitioner,partition-effectiveness',
+                        help="Comma separated jobs to run one after the other, from: " + ', '.join(sorted(JOB_CLASSES)))
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Directory of the materialized step outputs")
+    parser.add_argument('--clear-cache', action='store_true', default=False, help="Remove the materialized outputs first")
+    parser.add_argument('--num-reducers', default='5', help="--num-reducers of the partitioner jobs")
+    options, job_args = parser.parse_known_args(sys.argv[1:])
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    if options.clear_cache:
+        shutil.rmtree(options.cache_dir, ignore_errors=True)
+
+    runs = []
+    for name in options.jobs.split(','):
+        job_class = JOB_CLASSES[name]
+        args = list(job_args)
+        if 'num_reducers' in vars(job_class(args=[]).options):
+            args = ['--num-reducers', options.num_reducers] + args
+        input_paths = job_class(args=args).options.args
+        runs.append((name, run_executor(job_class, args, input_paths, options.cache_dir)))
+
+    # Print the job outputs
+    for name, (output, report, execution_time) in runs:
+        print('[{}]'.format(name))
+        for key, value in output:
+            print(key, value)
+
+    # Save the performance metrics results
+    save_result(runs, input_filename)
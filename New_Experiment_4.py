@@ -0,0 +1,321 @@
+'''
+New Experiment 4: Quote-Aware Parallel Splitting of CSV Inputs:
+The salary csv has quoted fields with embedded commas (Eg. "Aaron,Keontae E") and real exports can also carry quoted newlines,
+so cutting the file at arbitrary byte offsets can break records. Here we pick split points at safe record boundaries by scanning
+forward from each cut with quote-state resynchronization, so a large csv can be spread over many mapper tasks with every row
+processed exactly once. With --verify the job is also run as a single split and the record counts of both runs are compared.
+
+Input: A dataset containing employee data including names and salaries (Eg. salaries.csv, Tutorial_3_Input_1.csv)
+Output : Record count, top 10 annual salaries and total payroll along with split and verification measurements
+
+'''
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+import csv
+import io
+import shutil
+import tempfile
+import time
+import psutil
+import datetime
+import os
+import sys
+
+cols = 'Name,JobTitle,AgencyID,Agency,HireDate,AnnualSalary,GrossPay'.split(',')
+
+# States of the quote-state scanner used to validate a candidate record boundary
+FIELD_START, UNQUOTED, QUOTED, QUOTE_IN_QUOTED = range(4)
+
+QUOTE = ord('"')
+COMMA = ord(',')
+CR = ord('\r')
+LF = ord('\n')
+
+
+def scan_records(data, num_records, num_fields, at_eof):
+    """
+    Scan raw csv bytes with a small quote-state machine and check that they start on a record boundary.
+    A cut inside a quoted field shows up as a quote in the middle of an unquoted field, text after a closing quote
+    or a wrong number of fields, since the scanner then reads the quoting of the record inverted.
+
+    :param data: Bytes starting at the candidate boundary.
+    :param num_records: How many complete records must parse cleanly.
+    :param num_fields: Number of fields every record is expected to have.
+    :param at_eof: Whether *data* runs up to the end of the file.
+
+    :return: True if the candidate boundary is safe.
+    """
+    state = FIELD_START
+    fields = 1
+    records = 0
+
+    for i, c in enumerate(data):
+        if state == QUOTED:
+            if c == QUOTE:
+                state = QUOTE_IN_QUOTED
+            continue
+
+        if state == QUOTE_IN_QUOTED and c == QUOTE:
+            # Escaped quote ("") inside a quoted field
+            state = QUOTED
+        elif c == COMMA:
+            fields += 1
+            state = FIELD_START
+        elif c == LF or c == CR:
+            if c == CR and i + 1 < len(data) and data[i + 1] == LF:
+                continue  # Treat \r\n as a single record separator
+            if fields != num_fields:
+                return False
+            records += 1
+            if records == num_records:
+                return True
+            fields = 1
+            state = FIELD_START
+        elif state == QUOTE_IN_QUOTED:
+            return False  # Only a delimiter or newline may follow a closing quote
+        elif c == QUOTE:
+            if state == UNQUOTED:
+                return False  # Quote in the middle of an unquoted field
+            state = QUOTED
+        else:
+            state = UNQUOTED
+
+    # Ran out of data: accept only if we hit the end of the file on a complete record
+    if not at_eof or state == QUOTED:
+        return False
+    return records > 0 or fields == num_fields
+
+
+def find_record_boundary(f, offset, file_size, num_fields, lookahead_records=5, lookahead_bytes=1024 * 1024):
+    """
+    Find the first safe record boundary at or after a byte offset.
+
+    :param f: The csv file opened in binary mode.
+    :param offset: The byte offset of the raw split point.
+    :param file_size: Size of the file in bytes.
+    :param num_fields: Number of fields every record is expected to have.
+    :param lookahead_records: Number of records that must parse cleanly after a candidate boundary.
+    :param lookahead_bytes: Maximum number of bytes read to validate a candidate boundary.
+
+    :return: The byte offset of the boundary (file_size if there is none left).
+    """
+    if offset <= 0:
+        return 0
+
+    # Start at the line containing offset - 1 so an offset that already sits on a line start is kept
+    f.seek(offset - 1)
+    f.readline()
+
+    while True:
+        candidate = f.tell()
+        if candidate >= file_size:
+            return file_size
+
+        data = f.read(lookahead_bytes)
+        at_eof = candidate + len(data) >= file_size
+        if scan_records(data, lookahead_records, num_fields, at_eof):
+            return candidate
+
+        # Resynchronize on the next newline and try again
+        f.seek(candidate)
+        f.readline()
+
+
+def compute_csv_splits(path, num_splits, num_fields):
+    """
+    Split a csv file into byte ranges that start and end on record boundaries.
+
+    :param path: Path of the csv file.
+    :param num_splits: Target number of splits.
+    :param num_fields: Number of fields every record is expected to have.
+
+    :return: A list of (start, end) byte offsets covering the whole file exactly once.
+    """
+    file_size = os.path.getsize(path)
+    split_size = max(file_size // max(num_splits, 1), 1)
+
+    boundaries = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, num_splits):
+            boundary = find_record_boundary(f, max(i * split_size, boundaries[-1]), file_size, num_fields)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    if boundaries[-1] < file_size:
+        boundaries.append(file_size)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:])]
+
+
+def write_split_manifest(path, splits, manifest_path):
+    """Write one 'path<TAB>start<TAB>end' line per split, which is the input the mapper reads."""
+    path = os.path.abspath(path)
+    with open(manifest_path, 'w') as f:
+        for start, end in splits:
+            f.write(f"{path}\t{start}\t{end}\n")
+
+
+class MRQuoteAwareCsvSplit(MRJob):
+
+    # On Hadoop, give every manifest line (i.e. csv split) its own mapper task
+    HADOOP_INPUT_FORMAT = 'org.apache.hadoop.mapred.lib.NLineInputFormat'
+
+    def configure_args(self):
+        """Define custom arguments for splitting and verification."""
+        super(MRQuoteAwareCsvSplit, self).configure_args()
+        self.add_passthru_arg('--num-splits', type=int, default=8, help="Number of csv splits (mapper inputs)")
+        self.add_passthru_arg('--num-fields', type=int, default=len(cols), help="Number of fields in each csv record")
+        self.add_passthru_arg('--verify', action='store_true', default=False,
+                              help="Compare record counts against a single split run")
+
+    def steps(self):
+        return [
+            MRStep(mapper=self.mapper,
+                   combiner=self.combiner,
+                   reducer=self.reducer)
+        ]
+
+    def mapper(self, _, line):
+        # Each input line describes one split; NLineInputFormat may prefix it with a byte offset
+        path, start, end = line.split('\t')[-3:]
+        start, end = int(start), int(end)
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+
+        self.increment_counter('split', 'splits_read', 1)
+        self.increment_counter('split', 'bytes_read', len(data))
+
+        # The csv module handles quoted commas and quoted newlines within the split
+        for record in csv.reader(io.StringIO(data.decode('utf-8'), newline='')):
+            if not record:
+                continue
+            row = dict(zip(cols, [a.strip() for a in record]))
+
+            yield 'records', 1
+
+            try:
+                salary = float(row['AnnualSalary'][1:].replace(',', ''))
+            except (KeyError, ValueError):
+                self.increment_counter('warn', 'missing salary', 1)
+                continue
+
+            yield 'salary', (salary, record)
+            yield 'total_payroll', salary
+
+    def combiner(self, key, values):
+        if key == 'salary':
+            # Partial aggregation for top 10 salaries at the combiner stage
+            top_salaries = []
+            for value in values:
+                top_salaries.append(value)
+                top_salaries.sort(reverse=True)  # Sort in descending order
+                top_salaries = top_salaries[:10]  # Keep only the top 10
+
+            for salary in top_salaries:
+                yield key, salary
+        else:
+            # 'records' and 'total_payroll' are plain sums
+            yield key, sum(values)
+
+    reducer = combiner
+
+
+def run_job(job_args):
+    """Run the job with the given command line arguments and collect its output as {key: [values]}."""
+    job = MRQuoteAwareCsvSplit(args=job_args)
+    results = {}
+    with job.make_runner() as runner:
+        runner.run()
+        for key, value in job.parse_output(runner.cat_output()):
+            results.setdefault(key, []).append(value)
+    return results
+
+
+# Function to monitor system resources
+def monitor_resources():
+    memory_info = psutil.virtual_memory()
+    memory_usage = memory_info.used / (1024 ** 2)  # Convert to MB
+    cpu_usage = psutil.cpu_percent(interval=1)  # CPU usage in percentage
+    return memory_usage, cpu_usage
+
+#function to save result
+def save_result(execution_time, split_time, memory_usage_before, memory_usage_after, cpu_usage, splits, results, verification, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "4", f"New_Experiment_4_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        f.write("Execution time: {:.4f} seconds\n".format(execution_time))
+        f.write("Split computation time: {:.4f} seconds\n".format(split_time))
+        f.write("Memory usage before job: {:.2f} MB\n".format(memory_usage_before))
+        f.write("Memory usage after job: {:.2f} MB\n".format(memory_usage_after))
+        f.write("Average CPU Utilization: {}%\n".format(cpu_usage))
+        f.write("Number of splits: {}\n".format(len(splits)))
+        for start, end in splits:
+            f.write("  Split bytes {}-{}\n".format(start, end))
+        f.write("Records processed: {}\n".format(results.get('records', [0])[0]))
+        f.write("Total payroll: {:.2f}\n".format(results.get('total_payroll', [0])[0]))
+        if verification is not None:
+            single_split_records, matched = verification
+            f.write("Records processed with single split: {}\n".format(single_split_records))
+            f.write("Verification: {}\n".format("PASSED" if matched else "FAILED"))
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+if __name__ == '__main__':
+
+    # Parse the command line once to read the split options
+    options = MRQuoteAwareCsvSplit(args=sys.argv[1:]).options
+
+    if is_task_invocation(options):
+        # Run a single mapper/combiner/reducer task
+        MRQuoteAwareCsvSplit.run()
+        sys.exit(0)
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    start_time = time.time()
+    memory_usage_before, cpu_usage_before = monitor_resources()
+
+    # Compute safe split points and describe them in a manifest that becomes the job input
+    split_start = time.time()
+    splits = compute_csv_splits(input_filename, options.num_splits, options.num_fields)
+    split_time = time.time() - split_start
+
+    manifest_dir = tempfile.mkdtemp()
+    try:
+        manifest_path = os.path.join(manifest_dir, 'splits.txt')
+        write_split_manifest(input_filename, splits, manifest_path)
+        results = run_job(sys.argv[1:-1] + [manifest_path])
+
+        verification = None
+        if options.verify:
+            # Re-run over one split covering the whole file and compare record counts
+            single_manifest_path = os.path.join(manifest_dir, 'single_split.txt')
+            write_split_manifest(input_filename, [(0, os.path.getsize(input_filename))], single_manifest_path)
+            single_results = run_job(sys.argv[1:-1] + [single_manifest_path])
+            single_split_records = single_results.get('records', [0])[0]
+            verification = (single_split_records, single_split_records == results.get('records', [0])[0])
+    finally:
+        shutil.rmtree(manifest_dir, ignore_errors=True)
+
+    end_time = time.time()
+    execution_time = end_time - start_time
+    memory_usage_after, cpu_usage_after = monitor_resources()
+    cpu_usage = (cpu_usage_before + cpu_usage_after) / 2
+
+    # Print the job output
+    for key in ('records', 'total_payroll', 'salary'):
+        for value in results.get(key, []):
+            print(key, value)
+
+    # Save the performance metrics results
+    save_result(execution_time, split_time, memory_usage_before, memory_usage_after, cpu_usage, splits, results, verification, input_filename)
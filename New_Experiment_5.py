@@ -0,0 +1,267 @@
+'''
+New Experiment 5: Secondary-Sort Top-K Salaries through the Shuffle:
+The salary reducers in Tutorial 3 buffer and sort every value themselves, because values reach the reducer in no particular order.
+Here the salary is moved into a composite key (logical key + salary) that the shuffle sorts in descending salary order while
+partitioning on the logical key only, so each reducer (and combiner) receives its records already sorted and stops after the first 10.
+The same key layout works with the Hadoop streaming key-field options and with mrjob's SORT_VALUES in the local runner.
+With --benchmark both the secondary-sort job and the original buffering job are run and timed on the same input.
+
+Input: A dataset containing employee data including names and salaries (Eg. salaries.csv, Tutorial_3_Input_1.csv)
+Output : Top 10 annual salaries and gross pay in descending order, with a timing comparison against buffering in the reducer
+
+'''
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+from itertools import islice
+import csv
+import json
+import time
+import psutil
+import datetime
+import os
+import sys
+
+cols = 'Name,JobTitle,AgencyID,Agency,HireDate,AnnualSalary,GrossPay'.split(',')
+
+# Number of top records to keep per key
+TOP_K = 10
+
+# Amounts are stored as (SALARY_CEILING - amount) in fixed width text, so sorting the composite key as plain text
+# (which is all the local runner's SORT_VALUES can do) puts the highest amounts first
+SALARY_CEILING = 10 ** 12
+
+
+def descending_sort_key(amount):
+    """
+    Encode an amount as fixed-width text whose ascending text order is the descending numeric order of the amount.
+
+    :param amount: The salary or gross pay.
+
+    :return: A 16 character string, e.g. 0999999761228.00 for 238772.00
+    """
+    return '%016.2f' % (SALARY_CEILING - amount)
+
+
+def decode_sort_key(sort_key):
+    """Turn a key made by descending_sort_key() back into the amount."""
+    return round(SALARY_CEILING - float(sort_key), 2)
+
+
+class CompositeKeyProtocol(object):
+    """
+    Internal protocol that writes (key, (sort_key, record)) as 'key<TAB>sort_key<TAB>record'.
+    With stream.num.map.output.key.fields=2 Hadoop treats 'key<TAB>sort_key' as the composite key, and the local runner
+    sorts on the whole line when SORT_VALUES is set, so both shuffle the records in descending amount order.
+    The record (a json string) is left undecoded so reducers only pay for parsing the records they actually use.
+    """
+
+    def read(self, line):
+        key, sort_key, record = line.decode('utf_8').split('\t', 2)
+        return key, (sort_key, record)
+
+    def write(self, key, value):
+        sort_key, record = value
+        return '\t'.join((key, sort_key, record)).encode('utf_8')
+
+
+def configure_strategy_args(job):
+    """Arguments shared by both implementations, so the task processes can tell which job to run."""
+    job.add_passthru_arg('--strategy', choices=('secondary-sort', 'buffer'), default='secondary-sort',
+                         help="secondary-sort: sorted by the shuffle, buffer: sorted in the reducer")
+    job.add_passthru_arg('--benchmark', action='store_true', default=False,
+                         help="Run and time both strategies on the same input")
+
+
+#Original Implementation Class
+class salarymax(MRJob):
+
+    def configure_args(self):
+        super(salarymax, self).configure_args()
+        configure_strategy_args(self)
+
+    def mapper(self, _, line):
+        # Convert each line into a dictionary
+        row = dict(zip(cols, [ a.strip() for a in next(csv.reader([line]))]))
+
+        try:
+            # Yield the salary
+            yield 'salary', (float(row['AnnualSalary'][1:].replace(',', '')), line)
+        except ValueError:
+            self.increment_counter('warn', 'missing salary', 1)
+
+        # Yield the gross pay
+        try:
+            yield 'gross', (float(row['GrossPay'][1:].replace(',', '')), line)
+        except ValueError:
+            self.increment_counter('warn', 'missing gross', 1)
+
+    def reducer(self, key, values):
+        topten = []
+        values_read = 0
+
+        # For 'salary' and 'gross' compute the top 10, reading every value
+        for p in values:
+            values_read += 1
+            topten.append(p)
+            topten.sort()
+            topten = topten[-TOP_K:]
+
+        # One counter update per key, as each update is a line written to stderr
+        self.increment_counter('topk', 'values_read', values_read)
+
+        for p in reversed(topten):
+            yield key, p
+
+    combiner = reducer
+
+
+#Modified Implementation Class
+class MRTopSalariesSecondarySort(MRJob):
+
+    INTERNAL_PROTOCOL = CompositeKeyProtocol
+
+    # Local runner: sort mapper output by the whole line (key, then sort_key) and partition on the key only
+    SORT_VALUES = True
+
+    # Hadoop streaming: the composite key is the first two fields, partitioned on field 1 and compared on fields 1 and 2
+    JOBCONF = {
+        'stream.num.map.output.key.fields': 2,
+        'mapreduce.partition.keypartitioner.options': '-k1,1',
+        'mapreduce.job.output.key.comparator.class': 'org.apache.hadoop.mapreduce.lib.partition.KeyFieldBasedComparator',
+        'mapreduce.partition.keycomparator.options': '-k1,1 -k2,2',
+    }
+
+    def configure_args(self):
+        super(MRTopSalariesSecondarySort, self).configure_args()
+        configure_strategy_args(self)
+
+    def steps(self):
+        return [
+            MRStep(mapper=self.mapper,
+                   combiner=self.combiner,
+                   reducer=self.reducer)
+        ]
+
+    def mapper(self, _, line):
+        # Convert each line into a dictionary
+        row = dict(zip(cols, [a.strip() for a in next(csv.reader([line]))]))
+        record = json.dumps(line)
+
+        # Put the amount into the composite key instead of the value
+        try:
+            yield 'salary', (descending_sort_key(float(row['AnnualSalary'][1:].replace(',', ''))), record)
+        except ValueError:
+            self.increment_counter('warn', 'missing salary', 1)
+
+        try:
+            yield 'gross', (descending_sort_key(float(row['GrossPay'][1:].replace(',', ''))), record)
+        except ValueError:
+            self.increment_counter('warn', 'missing gross', 1)
+
+    def combiner(self, key, values):
+        # Values arrive sorted, so the first 10 are the local top 10
+        for sort_key, record in islice(values, TOP_K):
+            self.increment_counter('topk', 'values_read', 1)
+            yield key, (sort_key, record)
+
+    def reducer(self, key, values):
+        # Values arrive sorted, so stop after the first 10 without reading the rest
+        for sort_key, record in islice(values, TOP_K):
+            self.increment_counter('topk', 'values_read', 1)
+            yield key, (decode_sort_key(sort_key), json.loads(record))
+
+
+JOB_CLASSES = {
+    'secondary-sort': MRTopSalariesSecondarySort,
+    'buffer': salarymax,
+}
+
+
+def run_job(job_class, job_args):
+    """Run a job, returning its output as a list of (key, value) pairs, its counters and its execution time."""
+    job = job_class(args=job_args)
+    start_time = time.time()
+    with job.make_runner() as runner:
+        runner.run()
+        output = list(job.parse_output(runner.cat_output()))
+        counters = runner.counters()
+    return output, counters, time.time() - start_time
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+# Function to monitor system resources
+def monitor_resources():
+    memory_info = psutil.virtual_memory()
+    memory_usage = memory_info.used / (1024 ** 2)  # Convert to MB
+    cpu_usage = psutil.cpu_percent(interval=1)  # CPU usage in percentage
+    return memory_usage, cpu_usage
+
+#function to save result
+def save_result(runs, memory_usage_before, memory_usage_after, cpu_usage, outputs_match, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "5", f"New_Experiment_5_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        for strategy, (output, counters, execution_time) in runs.items():
+            values_read = sum(c.get('topk', {}).get('values_read', 0) for c in counters)
+            f.write("[{}] Execution time: {:.4f} seconds\n".format(strategy, execution_time))
+            f.write("[{}] Values read by combiners and reducers: {}\n".format(strategy, values_read))
+        f.write("Memory usage before job: {:.2f} MB\n".format(memory_usage_before))
+        f.write("Memory usage after job: {:.2f} MB\n".format(memory_usage_after))
+        f.write("Average CPU Utilization: {}%\n".format(cpu_usage))
+        if outputs_match is not None:
+            f.write("Top 10 results match: {}\n".format(outputs_match))
+
+
+if __name__ == '__main__':
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    options = MRTopSalariesSecondarySort(args=sys.argv[1:]).options
+
+    if is_task_invocation(options):
+        # Run a single mapper/combiner/reducer task of the selected implementation
+        JOB_CLASSES[options.strategy].run()
+        sys.exit(0)
+
+    memory_usage_before, cpu_usage_before = monitor_resources()
+
+    # Run the selected strategy, or both of them when benchmarking
+    strategies = ['secondary-sort', 'buffer'] if options.benchmark else [options.strategy]
+
+    # Strip the options the driver resolves itself (--strategy VALUE and --strategy=VALUE); everything else is passed on
+    base_args = []
+    args = iter(sys.argv[1:])
+    for arg in args:
+        if arg == '--strategy':
+            next(args, None)
+        elif arg != '--benchmark' and not arg.startswith('--strategy='):
+            base_args.append(arg)
+
+    runs = {}
+    for strategy in strategies:
+        runs[strategy] = run_job(JOB_CLASSES[strategy], ['--strategy', strategy] + base_args)
+
+    memory_usage_after, cpu_usage_after = monitor_resources()
+    cpu_usage = (cpu_usage_before + cpu_usage_after) / 2
+
+    # Both strategies must agree on the top 10 amounts
+    outputs_match = None
+    if options.benchmark:
+        amounts = [sorted((key, value[0]) for key, value in runs[strategy][0]) for strategy in strategies]
+        outputs_match = amounts[0] == amounts[1]
+
+    # Print the job output
+    for key, value in runs[strategies[0]][0]:
+        print(key, value)
+
+    # Save the performance metrics results
+    save_result(runs, memory_usage_before, memory_usage_after, cpu_usage, outputs_match, input_filename)
@@ -0,0 +1,367 @@
+'''
+New Experiment 6: Grouped Salary Analytics with Mergeable Partial Aggregates:
+So far we only compute a global top 10 and the total payroll. Here we compute per Agency and per JobTitle count, sum, mean,
+standard deviation, min/max and approximate percentiles of AnnualSalary and GrossPay. Mappers and combiners emit compact mergeable
+partial states (count, sum, sum of squares, min, max and a t-digest for quantiles) instead of raw values, so the shuffle size
+grows with the number of groups instead of the number of rows. With --verify the results are checked against an exact computation.
+
+Input: A dataset containing employee data including names and salaries (Eg. salaries.csv, Tutorial_3_Input_1.csv)
+Output : Per group statistics of AnnualSalary and GrossPay, along with shuffle and verification measurements
+
+'''
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+from bisect import bisect_left, bisect_right
+import csv
+import math
+import time
+import psutil
+import datetime
+import os
+import sys
+
+cols = 'Name,JobTitle,AgencyID,Agency,HireDate,AnnualSalary,GrossPay'.split(',')
+
+# Columns we group by and the measures we aggregate for each group
+GROUP_COLUMNS = ('Agency', 'JobTitle')
+MEASURE_COLUMNS = ('AnnualSalary', 'GrossPay')
+
+# Percentiles reported for each group
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class TDigest(object):
+    """
+    A small merging t-digest: a sorted list of (mean, weight) centroids whose sizes are bounded by the k1 scale function,
+    so centroids near the tails stay small (accurate extreme percentiles) and the whole digest stays O(compression) in size.
+    Two digests merge by concatenating their centroids and compressing again, which makes them usable as combiner state.
+    """
+
+    def __init__(self, compression=100, centroids=None):
+        self.compression = compression
+        self.centroids = [list(c) for c in centroids] if centroids else []
+
+    def add(self, value, weight=1):
+        self.centroids.append([value, weight])
+        # Keep the unmerged buffer bounded
+        if len(self.centroids) > 10 * self.compression:
+            self.compress()
+
+    def merge(self, other):
+        self.centroids.extend(other.centroids)
+        self.compress()
+
+    def _k(self, q):
+        # k1 scale function
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def compress(self):
+        if not self.centroids:
+            return
+        self.centroids.sort()
+        total = float(sum(w for _, w in self.centroids))
+
+        merged = []
+        mean, weight = self.centroids[0]
+        weight_so_far = 0
+        k_lower = self._k(0.0)
+
+        for m, w in self.centroids[1:]:
+            if self._k((weight_so_far + weight + w) / total) - k_lower <= 1:
+                # Fold the centroid into the current one
+                mean += (m - mean) * w / (weight + w)
+                weight += w
+            else:
+                merged.append([mean, weight])
+                weight_so_far += weight
+                k_lower = self._k(weight_so_far / total)
+                mean, weight = m, w
+
+        merged.append([mean, weight])
+        self.centroids = merged
+
+    def quantile(self, q, minimum, maximum):
+        """
+        Estimate the q-th quantile by interpolating between centroid centers.
+
+        :param q: The quantile in [0, 1].
+        :param minimum: The exact minimum, used at the lower tail.
+        :param maximum: The exact maximum, used at the upper tail.
+
+        :return: The estimated value.
+        """
+        self.compress()
+        if not self.centroids:
+            return None
+
+        total = sum(w for _, w in self.centroids)
+        target = q * total
+
+        # Cumulative weight at the center of each centroid, with the exact min/max pinned at both ends
+        points = [(0.0, minimum)]
+        cumulative = 0
+        for mean, weight in self.centroids:
+            points.append((cumulative + weight / 2.0, mean))
+            cumulative += weight
+        points.append((float(total), maximum))
+
+        i = bisect_left([p[0] for p in points], target)
+        if i == 0:
+            return minimum
+        (x0, y0), (x1, y1) = points[i - 1], points[i]
+        if x1 == x0:
+            return y1
+        return y0 + (y1 - y0) * (target - x0) / (x1 - x0)
+
+
+def new_partial(value):
+    """A partial aggregate state for a single value: [count, sum, sum of squares, min, max, centroids]."""
+    return [1, value, value * value, value, value, [[value, 1]]]
+
+
+def merge_partials(partials, compression):
+    """
+    Merge partial aggregate states into one.
+
+    :param partials: An iterable of states made by new_partial() or merge_partials().
+    :param compression: The t-digest compression, which bounds the number of centroids kept.
+
+    :return: The merged state.
+    """
+    count, total, total_sq = 0, 0.0, 0.0
+    minimum, maximum = float('inf'), float('-inf')
+    digest = TDigest(compression)
+
+    for c, s, sq, lo, hi, centroids in partials:
+        count += c
+        total += s
+        total_sq += sq
+        minimum = min(minimum, lo)
+        maximum = max(maximum, hi)
+        for mean, weight in centroids:
+            digest.add(mean, weight)
+
+    digest.compress()
+    return [count, total, total_sq, minimum, maximum, digest.centroids]
+
+
+def finalize_partial(partial, compression):
+    """Turn a merged state into the reported statistics."""
+    count, total, total_sq, minimum, maximum, centroids = partial
+    mean = total / count
+    variance = max(total_sq / count - mean * mean, 0.0)
+    digest = TDigest(compression, centroids)
+
+    stats = {
+        'count': count,
+        'sum': round(total, 2),
+        'mean': round(mean, 2),
+        'stddev': round(math.sqrt(variance), 2),
+        'min': minimum,
+        'max': maximum,
+    }
+    for q in PERCENTILES:
+        stats['p%d' % round(q * 100)] = round(digest.quantile(q, minimum, maximum), 2)
+    return stats
+
+
+def parse_amount(value):
+    """Parse an amount like $11310.00 into a float (ValueError if missing)."""
+    return float(value.strip()[1:].replace(',', ''))
+
+
+class MRGroupedSalaryStats(MRJob):
+
+    def configure_args(self):
+        """Define custom arguments for the quantile sketch and verification."""
+        super(MRGroupedSalaryStats, self).configure_args()
+        self.add_passthru_arg('--compression', type=int, default=100, help="t-digest compression (centroids kept per group)")
+        self.add_passthru_arg('--verify', action='store_true', default=False,
+                              help="Check the results against an exact computation")
+
+    def steps(self):
+        return [
+            MRStep(mapper_init=self.mapper_init,
+                   mapper=self.mapper,
+                   mapper_final=self.mapper_final,
+                   combiner=self.combiner,
+                   reducer=self.reducer)
+        ]
+
+    def mapper_init(self):
+        self.records_out = 0
+
+    def mapper(self, _, line):
+        # Convert each line into a dictionary
+        row = dict(zip(cols, [a.strip() for a in next(csv.reader([line]))]))
+
+        for measure in MEASURE_COLUMNS:
+            try:
+                value = parse_amount(row[measure])
+            except (KeyError, ValueError):
+                self.increment_counter('warn', 'missing ' + measure, 1)
+                continue
+
+            for group_column in GROUP_COLUMNS:
+                self.records_out += 1
+                yield (group_column, row[group_column], measure), new_partial(value)
+
+    def mapper_final(self):
+        # One counter update per task, as each update is a line written to stderr
+        self.increment_counter('shuffle', 'mapper records out', self.records_out)
+
+    def combiner(self, key, partials):
+        # Emit one compact state per group instead of the raw values
+        self.increment_counter('shuffle', 'combiner records out', 1)
+        yield key, merge_partials(partials, self.options.compression)
+
+    def reducer(self, key, partials):
+        group_column, group, measure = key
+        partial = merge_partials(partials, self.options.compression)
+        yield (group_column, group, measure), finalize_partial(partial, self.options.compression)
+
+
+def exact_stats(input_filename):
+    """Compute the exact per group statistics in memory, used to verify the job output."""
+    values = {}
+    with open(input_filename, newline='') as f:
+        for record in csv.reader(f):
+            row = dict(zip(cols, [a.strip() for a in record]))
+            for measure in MEASURE_COLUMNS:
+                try:
+                    value = parse_amount(row[measure])
+                except (KeyError, ValueError):
+                    continue
+                for group_column in GROUP_COLUMNS:
+                    values.setdefault((group_column, row[group_column], measure), []).append(value)
+
+    stats = {}
+    for key, group_values in values.items():
+        group_values.sort()
+        n = len(group_values)
+        stats[key] = {
+            'count': n,
+            'sum': sum(group_values),
+            'min': group_values[0],
+            'max': group_values[-1],
+            'values': group_values,
+        }
+    return stats
+
+
+def verify(results, exact):
+    """
+    Compare the job output with the exact statistics. Percentiles are checked by rank, which is what the t-digest bounds:
+    the estimate's midpoint rank range among the exact values (ties included) should contain q * count.
+
+    :return: (number of groups, groups with a wrong count/sum/min/max, worst percentile rank error as a fraction of the count)
+    """
+    mismatches = 0
+    worst_rank_error = 0.0
+
+    for key, expected in exact.items():
+        actual = results.get(key)
+        if (actual is None or actual['count'] != expected['count']
+                or abs(actual['sum'] - expected['sum']) > 0.01
+                or actual['min'] != expected['min'] or actual['max'] != expected['max']):
+            mismatches += 1
+            continue
+
+        group_values = expected['values']
+        n = len(group_values)
+        for q in PERCENTILES:
+            estimate = actual['p%d' % round(q * 100)]
+            # Values below / not above the estimate (amounts are rounded to cents)
+            lo = bisect_left(group_values, estimate - 0.005) - 0.5
+            hi = bisect_right(group_values, estimate + 0.005) + 0.5
+            target = q * n
+            rank_error = max(lo - target, target - hi, 0.0) / n
+            worst_rank_error = max(worst_rank_error, rank_error)
+
+    return len(exact), mismatches, worst_rank_error
+
+
+def run_job(job_args):
+    """Run the job, returning its output as {(group column, group, measure): stats} and its counters."""
+    job = MRGroupedSalaryStats(args=job_args)
+    with job.make_runner() as runner:
+        runner.run()
+        results = {tuple(key): stats for key, stats in job.parse_output(runner.cat_output())}
+        counters = runner.counters()
+    return results, counters
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+# Function to monitor system resources
+def monitor_resources():
+    memory_info = psutil.virtual_memory()
+    memory_usage = memory_info.used / (1024 ** 2)  # Convert to MB
+    cpu_usage = psutil.cpu_percent(interval=1)  # CPU usage in percentage
+    return memory_usage, cpu_usage
+
+#function to save result
+def save_result(execution_time, memory_usage_before, memory_usage_after, cpu_usage, results, counters, verification, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "6", f"New_Experiment_6_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    shuffle = {}
+    for step_counters in counters:
+        for name, count in step_counters.get('shuffle', {}).items():
+            shuffle[name] = shuffle.get(name, 0) + count
+
+    with open(filename, "w") as f:
+        f.write("Execution time: {:.4f} seconds\n".format(execution_time))
+        f.write("Memory usage before job: {:.2f} MB\n".format(memory_usage_before))
+        f.write("Memory usage after job: {:.2f} MB\n".format(memory_usage_after))
+        f.write("Average CPU Utilization: {}%\n".format(cpu_usage))
+        f.write("Mapper records out: {}\n".format(shuffle.get('mapper records out', 0)))
+        f.write("Combiner records out (shuffled): {}\n".format(shuffle.get('combiner records out', 0)))
+        f.write("Groups: {}\n".format(len(results)))
+        if verification is not None:
+            num_groups, mismatches, worst_rank_error = verification
+            f.write("Verified groups: {}\n".format(num_groups))
+            f.write("Groups with wrong count/sum/min/max: {}\n".format(mismatches))
+            f.write("Worst percentile rank error: {:.4%}\n".format(worst_rank_error))
+        for key in sorted(results):
+            f.write("{}: {}\n".format(" / ".join(key), results[key]))
+
+
+if __name__ == '__main__':
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    options = MRGroupedSalaryStats(args=sys.argv[1:]).options
+
+    if is_task_invocation(options):
+        # Run a single mapper/combiner/reducer task
+        MRGroupedSalaryStats.run()
+        sys.exit(0)
+
+    start_time = time.time()
+    memory_usage_before, cpu_usage_before = monitor_resources()
+
+    # Run the job
+    results, counters = run_job(sys.argv[1:])
+
+    end_time = time.time()
+    execution_time = end_time - start_time
+    memory_usage_after, cpu_usage_after = monitor_resources()
+    cpu_usage = (cpu_usage_before + cpu_usage_after) / 2
+
+    # Check the results against an exact computation
+    verification = verify(results, exact_stats(input_filename)) if options.verify else None
+
+    # Print the job output
+    for key in sorted(results):
+        print(" / ".join(key), results[key])
+
+    # Save the performance metrics results
+    save_result(execution_time, memory_usage_before, memory_usage_after, cpu_usage, results, counters, verification, input_filename)
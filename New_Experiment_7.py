@@ -0,0 +1,322 @@
+'''
+New Experiment 7: Map-Side Broadcast Hash Join against a Small Dimension Table:
+Here salary rows are enriched with a per AgencyID dimension file (department, region, budget code) before aggregating the payroll.
+A reduce-side join would shuffle the whole salary file once more, so instead the small dimension file is shipped once to every task
+and mapper_init loads it into an in-memory hash table, and the join happens in the mapper. When the dimension file is larger than
+--broadcast-threshold the job falls back to a reduce-side join. With --benchmark both join strategies are run and compared.
+If no --dimension-file is given, a sample one is generated from the AgencyID and Agency columns of the input.
+
+Input: A dataset containing employee data including names and salaries (Eg. salaries.csv) and a dimension csv
+       with AgencyID,Department,Region,BudgetCode rows
+Output : Employee count and total annual salary per (Department, Region, BudgetCode), with a timing comparison of both join strategies
+
+'''
+
+from mrjob.job import MRJob
+from mrjob.step import MRStep
+from mrjob.compat import jobconf_from_env
+import csv
+import shutil
+import tempfile
+import time
+import psutil
+import datetime
+import os
+import sys
+import zlib
+
+cols = 'Name,JobTitle,AgencyID,Agency,HireDate,AnnualSalary,GrossPay'.split(',')
+dimension_cols = 'AgencyID,Department,Region,BudgetCode'.split(',')
+
+# Dimension values used for salary rows whose AgencyID is not in the dimension file (left join)
+UNKNOWN = ('UNKNOWN', 'UNKNOWN', 'UNKNOWN')
+
+# Regions used for the generated sample dimension file
+SAMPLE_REGIONS = ('North', 'South', 'East', 'West')
+
+
+def configure_join_args(job):
+    """Arguments shared by both join implementations."""
+    job.add_file_arg('--dimension-file', help="csv file with AgencyID,Department,Region,BudgetCode rows")
+    job.add_passthru_arg('--join-strategy', choices=('auto', 'map', 'reduce'), default='auto',
+                         help="map: broadcast hash join, reduce: reduce-side join, auto: map unless over the threshold")
+    job.add_passthru_arg('--broadcast-threshold', type=int, default=64 * 1024 * 1024,
+                         help="Largest dimension file (bytes) loaded into memory by the map-side join")
+    job.add_passthru_arg('--benchmark', action='store_true', default=False,
+                         help="Run and time both join strategies on the same input")
+
+
+def parse_salary(row):
+    """Parse the annual salary of a row like $11310.00 into a float (ValueError if missing)."""
+    return float(row['AnnualSalary'][1:].replace(',', ''))
+
+
+def load_dimension_table(path):
+    """
+    Load the dimension file into a hash table of AgencyID -> (Department, Region, BudgetCode).
+    Repeated strings such as regions are interned so each distinct value is stored once.
+
+    :param path: Path of the dimension csv file.
+
+    :return: The dict.
+    """
+    table = {}
+    with open(path, newline='') as f:
+        for record in csv.reader(f):
+            if len(record) != len(dimension_cols):
+                continue
+            agency_id, department, region, budget_code = [sys.intern(a.strip()) for a in record]
+            table[agency_id] = (department, region, budget_code)
+    return table
+
+
+#Map-Side Join Class
+class MRBroadcastHashJoin(MRJob):
+
+    def configure_args(self):
+        super(MRBroadcastHashJoin, self).configure_args()
+        configure_join_args(self)
+
+    def steps(self):
+        return [
+            MRStep(mapper_init=self.mapper_init,
+                   mapper=self.mapper,
+                   combiner=self.combiner,
+                   reducer=self.reducer)
+        ]
+
+    def mapper_init(self):
+        # The dimension file has been shipped into the task's working directory; load it once per task
+        self.dimension_table = load_dimension_table(self.options.dimension_file)
+        self.increment_counter('join', 'dimension rows loaded', len(self.dimension_table))
+
+    def mapper(self, _, line):
+        # Convert each line into a dictionary
+        row = dict(zip(cols, [a.strip() for a in next(csv.reader([line]))]))
+
+        try:
+            salary = parse_salary(row)
+        except (KeyError, ValueError):
+            self.increment_counter('warn', 'missing salary', 1)
+            return
+
+        # Join against the in-memory hash table
+        dimension = self.dimension_table.get(row['AgencyID'])
+        if dimension is None:
+            self.increment_counter('join', 'unmatched AgencyID', 1)
+            dimension = UNKNOWN
+
+        yield dimension, (1, salary)
+
+    def combiner(self, dimension, counts_and_salaries):
+        # Sum up the employee count and salaries per dimension
+        count, total = 0, 0.0
+        for c, salary in counts_and_salaries:
+            count += c
+            total += salary
+        yield dimension, (count, total)
+
+    def reducer(self, dimension, counts_and_salaries):
+        count, total = 0, 0.0
+        for c, salary in counts_and_salaries:
+            count += c
+            total += salary
+        yield dimension, (count, round(total, 2))
+
+
+#Reduce-Side Join Class
+class MRReduceSideJoin(MRJob):
+
+    # Sort values so the dimension record ('D') reaches each reducer before the salary records ('S')
+    SORT_VALUES = True
+
+    def configure_args(self):
+        super(MRReduceSideJoin, self).configure_args()
+        configure_join_args(self)
+
+    def steps(self):
+        return [
+            MRStep(mapper=self.mapper_tag_records,
+                   reducer=self.reducer_join),
+            MRStep(combiner=self.combiner_sum,
+                   reducer=self.reducer_sum)
+        ]
+
+    def mapper_tag_records(self, _, line):
+        record = [a.strip() for a in next(csv.reader([line]), [])]
+
+        # Tell the two inputs apart by the file this split came from
+        input_file = jobconf_from_env('mapreduce.map.input.file', '')
+        if os.path.basename(input_file) == os.path.basename(self.options.dimension_file):
+            # Skip malformed dimension rows (Eg. blank lines), like load_dimension_table() does
+            if len(record) != len(dimension_cols):
+                return
+            agency_id, department, region, budget_code = record
+            yield agency_id, ('D', department, region, budget_code)
+            return
+
+        row = dict(zip(cols, record))
+        try:
+            salary = parse_salary(row)
+        except (KeyError, ValueError):
+            self.increment_counter('warn', 'missing salary', 1)
+            return
+
+        yield row['AgencyID'], ('S', salary)
+
+    def reducer_join(self, agency_id, tagged_values):
+        dimension = UNKNOWN
+        for value in tagged_values:
+            if value[0] == 'D':
+                dimension = tuple(value[1:])
+                continue
+            if dimension is UNKNOWN:
+                # Count every unmatched salary row, like the map-side join does
+                self.increment_counter('join', 'unmatched AgencyID', 1)
+            yield dimension, (1, value[1])
+
+    def combiner_sum(self, dimension, counts_and_salaries):
+        count, total = 0, 0.0
+        for c, salary in counts_and_salaries:
+            count += c
+            total += salary
+        yield dimension, (count, total)
+
+    def reducer_sum(self, dimension, counts_and_salaries):
+        count, total = 0, 0.0
+        for c, salary in counts_and_salaries:
+            count += c
+            total += salary
+        yield dimension, (count, round(total, 2))
+
+
+JOB_CLASSES = {
+    'map': MRBroadcastHashJoin,
+    'reduce': MRReduceSideJoin,
+}
+
+
+def choose_join_strategy(options):
+    """Pick the map-side join unless the dimension file is over the broadcast threshold (or a strategy is forced)."""
+    if options.join_strategy != 'auto':
+        return options.join_strategy
+    if os.path.getsize(options.dimension_file) > options.broadcast_threshold:
+        return 'reduce'
+    return 'map'
+
+
+def write_sample_dimension_file(input_filename, path):
+    """Generate a dimension file with one row per AgencyID of the salary input."""
+    agencies = {}
+    with open(input_filename, newline='') as f:
+        for record in csv.reader(f):
+            row = dict(zip(cols, [a.strip() for a in record]))
+            agencies.setdefault(row['AgencyID'], row['Agency'])
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        for agency_id, agency in sorted(agencies.items()):
+            region = SAMPLE_REGIONS[zlib.crc32(agency.encode('utf-8')) % len(SAMPLE_REGIONS)]
+            writer.writerow([agency_id, agency, region, 'BC-' + agency_id[:3]])
+
+
+def run_job(strategy, job_args, input_filename, dimension_file):
+    """Run one join strategy, returning its output as {dimension: (count, total)} and its execution time."""
+    if strategy == 'reduce':
+        # The dimension file is a second input of the reduce-side join
+        job_args = job_args + [dimension_file]
+    job = JOB_CLASSES[strategy](args=['--join-strategy', strategy, '--dimension-file', dimension_file] + job_args + [input_filename])
+
+    start_time = time.time()
+    with job.make_runner() as runner:
+        runner.run()
+        results = {tuple(key): tuple(value) for key, value in job.parse_output(runner.cat_output())}
+    return results, time.time() - start_time
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+# Function to monitor system resources
+def monitor_resources():
+    memory_info = psutil.virtual_memory()
+    memory_usage = memory_info.used / (1024 ** 2)  # Convert to MB
+    cpu_usage = psutil.cpu_percent(interval=1)  # CPU usage in percentage
+    return memory_usage, cpu_usage
+
+#function to save result
+def save_result(runs, dimension_file_size, memory_usage_before, memory_usage_after, cpu_usage, outputs_match, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "7", f"New_Experiment_7_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        f.write("Dimension file size: {} bytes\n".format(dimension_file_size))
+        for strategy, (results, execution_time) in runs.items():
+            f.write("[{}-side join] Execution time: {:.4f} seconds\n".format(strategy, execution_time))
+        f.write("Memory usage before job: {:.2f} MB\n".format(memory_usage_before))
+        f.write("Memory usage after job: {:.2f} MB\n".format(memory_usage_after))
+        f.write("Average CPU Utilization: {}%\n".format(cpu_usage))
+        if outputs_match is not None:
+            f.write("Join results match: {}\n".format(outputs_match))
+
+
+if __name__ == '__main__':
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    options = MRBroadcastHashJoin(args=sys.argv[1:]).options
+
+    if is_task_invocation(options):
+        # Run a single mapper/combiner/reducer task of the selected join
+        JOB_CLASSES[options.join_strategy].run()
+        sys.exit(0)
+
+    # Strip the options the driver resolves itself (in the OPTION VALUE and OPTION=VALUE forms); everything else is passed on
+    job_args = []
+    args = iter(sys.argv[1:-1])
+    for arg in args:
+        if arg in ('--dimension-file', '--join-strategy'):
+            next(args, None)
+        elif arg != '--benchmark' and not arg.startswith(('--dimension-file=', '--join-strategy=')):
+            job_args.append(arg)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        dimension_file = options.dimension_file
+        if not dimension_file:
+            dimension_file = os.path.join(temp_dir, 'agency_dimension.csv')
+            write_sample_dimension_file(input_filename, dimension_file)
+            options.dimension_file = dimension_file
+
+        memory_usage_before, cpu_usage_before = monitor_resources()
+
+        # Run the chosen join, or both of them when benchmarking
+        strategies = ['map', 'reduce'] if options.benchmark else [choose_join_strategy(options)]
+        runs = {}
+        for strategy in strategies:
+            runs[strategy] = run_job(strategy, job_args, input_filename, dimension_file)
+
+        memory_usage_after, cpu_usage_after = monitor_resources()
+        dimension_file_size = os.path.getsize(dimension_file)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    cpu_usage = (cpu_usage_before + cpu_usage_after) / 2
+
+    # Both strategies must produce the same aggregates
+    outputs_match = None
+    if options.benchmark:
+        outputs_match = runs['map'][0] == runs['reduce'][0]
+
+    # Print the job output
+    results = runs[strategies[0]][0]
+    for dimension in sorted(results):
+        print(dimension, results[dimension])
+
+    # Save the performance metrics results
+    save_result(runs, dimension_file_size, memory_usage_before, memory_usage_after, cpu_usage, outputs_match, input_filename)
@@ -0,0 +1,336 @@
+'''
+New Experiment 8: Pipelined Execution of Multi-Step Jobs:
+MRMostUsedWord, MRMostUsedWordWithCustomPartitioner and MRPartitionEffectivenessExperiment are two-step jobs, and in the local runner
+step 2 cannot start until step 1 has fully written, sorted and re-read its output from temporary files.
+Here the steps run in one process and the records of the step 1 reducers stream straight into the step 2 mapper (or into the
+step 2 sort buffer when step 2 is reducer only) as Python objects. The sort buffer only spills sorted runs to disk (combined, if the
+step has a combiner) when the records it holds take more than --memory-limit, and the runs are merged at most MERGE_FACTOR at a time. For comparison the same executor can materialize every step
+boundary to temporary files like the local runner does, and with --benchmark both modes and the real local runner are run.
+
+Input: Varied input text files (Eg. demo_input.txt, project_gutenberg_eBook_emma.txt, Tutorial_1_2_Input_1.txt)
+Output : Job output along with the hand-off time per step boundary, time saved by pipelining and peak memory
+
+'''
+
+from Tutorial_2_frequent_word_count import MRMostUsedWord
+from Modified_Tutorial_2 import MRMostUsedWordWithCustomPartitioner
+from New_Experiment_2 import MRPartitionEffectivenessExperiment
+from itertools import groupby
+from operator import itemgetter
+import argparse
+import heapq
+import json
+import shutil
+import tempfile
+import time
+import psutil
+import datetime
+import os
+import sys
+
+JOB_CLASSES = {
+    'most-used-word': MRMostUsedWord,
+    'custom-partitioner': MRMostUsedWordWithCustomPartitioner,
+    'partition-effectiveness': MRPartitionEffectivenessExperiment,
+}
+
+# How many records to buffer between two checks of the process memory (for the peak memory reported)
+MEMORY_CHECK_INTERVAL = 10000
+
+# Largest number of sorted runs merged (and so open) at once; more runs are merged in several passes
+MERGE_FACTOR = 64
+
+_NO_KEY = object()
+
+
+def sort_key(key):
+    """Sort order used for grouping; equal keys (including tuples vs. lists after a spill) encode the same."""
+    return json.dumps(key, sort_keys=True, default=repr)
+
+
+class PipelinedStepExecutor(object):
+    """
+    Runs all steps of a streaming MRJob in this process as one chain of generators.
+
+    With materialize=False, records cross a step boundary in memory and are only sorted (and spilled to disk under
+    memory pressure) where the next reducer needs them grouped. With materialize=True every step boundary and every
+    reducer input is written to a temporary file, sorted and re-read, the way the local runner hands records over.
+    """
+
+    def __init__(self, job, memory_limit_mb=1024, materialize=False, temp_dir=None):
+        self.job = job
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.materialize = materialize
+        self.temp_dir = temp_dir or tempfile.gettempdir()
+        self.protocol = job.internal_protocol()
+        self.process = psutil.Process()
+
+        self.peak_memory = 0
+        self.spills = 0
+        self.step_output_end = {}
+        self.reducer_input_start = {}
+
+    def _memory(self):
+        rss = self.process.memory_info().rss
+        self.peak_memory = max(self.peak_memory, rss)
+        return rss
+
+    def _temp_path(self, name):
+        fd, path = tempfile.mkstemp(prefix=name, dir=self.temp_dir)
+        os.close(fd)
+        return path
+
+    def _read_input(self, input_paths):
+        read, _ = self.job.pick_protocols(0, 'mapper')
+        for path in input_paths:
+            with open(path, 'rb') as f:
+                for line in f:
+                    yield read(line.rstrip(b'\r\n'))
+
+    def _write_run(self, pairs, name):
+        """Write (key, value) pairs to a temporary file with the internal protocol."""
+        path = self._temp_path(name)
+        with open(path, 'wb') as f:
+            for key, value in pairs:
+                f.write(self.protocol.write(key, value) + b'\n')
+        return path
+
+    def _read_run(self, path):
+        """Read back a file written by _write_run() as (sort key, key, value) triples, then delete it."""
+        try:
+            with open(path, 'rb') as f:
+                for line in f:
+                    key, value = self.protocol.read(line.rstrip(b'\n'))
+                    yield sort_key(key), key, value
+        finally:
+            os.remove(path)
+
+    def _mark_output_end(self, pairs, step_num):
+        """Pass records through, noting when the step's output is exhausted."""
+        for pair in pairs:
+            yield pair
+        self.step_output_end[step_num] = time.time()
+
+    def _mark_input_start(self, pairs, step_num):
+        """Pass records through, noting when the first record reaches the step's reducer."""
+        first = True
+        for pair in pairs:
+            if first:
+                self.reducer_input_start.setdefault(step_num, time.time())
+                first = False
+            yield pair
+        self.reducer_input_start.setdefault(step_num, time.time())
+
+    def _hand_off(self, pairs, step_num):
+        """Pass step output on to the next step, through a temporary file when materializing."""
+        pairs = self._mark_output_end(pairs, step_num)
+        if not self.materialize:
+            return pairs
+        path = self._write_run(pairs, 'step-%d-output-' % step_num)
+        return ((key, value) for _, key, value in self._read_run(path))
+
+    def _group_materialized(self, pairs, step_num):
+        """Write reducer input to a file, sort its lines by the encoded key and read it back (like the local runner)."""
+        path = self._write_run(pairs, 'step-%d-reducer-input-' % step_num)
+        try:
+            with open(path, 'rb') as f:
+                lines = f.readlines()
+            self._memory()
+        finally:
+            os.remove(path)
+        lines.sort(key=lambda line: line.split(b'\t')[0])
+        for line in lines:
+            yield self.protocol.read(line.rstrip(b'\n'))
+
+    def _spill(self, buffer, step, step_num):
+        """Sort the buffer (combining it if the step has a combiner) and write it out as a sorted run."""
+        buffer.sort(key=itemgetter(0))
+        pairs = ((key, value) for _, key, value in buffer)
+        if step.has_explicit_combiner:
+            pairs = self.job.combine_pairs(self._regroup(buffer), step_num)
+            pairs = sorted(pairs, key=lambda kv: sort_key(kv[0]))
+        self.spills += 1
+        return self._write_run(pairs, 'step-%d-spill-' % step_num)
+
+    def _merge_runs(self, runs, step_num):
+        """Merge sorted runs MERGE_FACTOR at a time into new runs until at most MERGE_FACTOR are left."""
+        while len(runs) > MERGE_FACTOR:
+            merged = heapq.merge(*[self._read_run(path) for path in runs[:MERGE_FACTOR]], key=itemgetter(0))
+            path = self._write_run(((key, value) for _, key, value in merged), 'step-%d-merge-' % step_num)
+            runs = runs[MERGE_FACTOR:] + [path]
+        return runs
+
+    def _regroup(self, triples):
+        """Turn sorted (sort key, key, value) triples into (key, value) pairs where every group shares one key object."""
+        for _, group in groupby(triples, key=itemgetter(0)):
+            group_key = _NO_KEY
+            for _, key, value in group:
+                if group_key is _NO_KEY:
+                    group_key = key
+                yield group_key, value
+
+    def _group_in_memory(self, pairs, step, step_num):
+        """Sort reducer input in memory, spilling sorted runs to disk only when the buffered records go over the memory limit."""
+        buffer = []
+        buffer_size = 0
+        runs = []
+
+        for key, value in pairs:
+            record = (sort_key(key), key, value)
+            buffer.append(record)
+            # The process memory is no measure of the buffer, as freed memory is rarely given back to the OS
+            buffer_size += sys.getsizeof(record) + sys.getsizeof(record[0]) + sys.getsizeof(key) + sys.getsizeof(value)
+            if buffer_size > self.memory_limit:
+                self._memory()
+                runs.append(self._spill(buffer, step, step_num))
+                buffer = []
+                buffer_size = 0
+            elif len(buffer) % MEMORY_CHECK_INTERVAL == 0:
+                self._memory()
+
+        self._memory()
+        if not runs:
+            buffer.sort(key=itemgetter(0))
+            return self._regroup(buffer)
+
+        # Spill what is left too, so every record has been through the protocol (Eg. tuples read back as lists), and merge the runs
+        runs.append(self._spill(buffer, step, step_num))
+        runs = self._merge_runs(runs, step_num)
+        merged = heapq.merge(*[self._read_run(path) for path in runs], key=itemgetter(0))
+        return self._regroup(merged)
+
+    def run(self, input_paths):
+        """
+        Run every step of the job.
+
+        :param input_paths: Paths of the input files.
+
+        :return: The (key, value) pairs output by the last step.
+        """
+        steps = self.job.steps()
+        pairs = self._read_input(input_paths)
+
+        for step_num, step in enumerate(steps):
+            if step_num == 0 or step.has_explicit_mapper:
+                pairs = self.job.map_pairs(pairs, step_num)
+
+            if step.has_explicit_reducer:
+                if self.materialize:
+                    grouped = self._group_materialized(pairs, step_num)
+                else:
+                    grouped = self._group_in_memory(pairs, step, step_num)
+                pairs = self.job.reduce_pairs(self._mark_input_start(grouped, step_num), step_num)
+
+            if step_num < len(steps) - 1:
+                pairs = self._hand_off(pairs, step_num)
+
+        output = list(pairs)
+        self._memory()
+        return output
+
+    def handoff_times(self):
+        """Seconds between the end of each step's output and the first record reaching the next step's reducer."""
+        return {
+            step_num: self.reducer_input_start[step_num + 1] - end
+            for step_num, end in sorted(self.step_output_end.items())
+            if step_num + 1 in self.reducer_input_start
+        }
+
+
+def run_executor(job_class, job_args, input_paths, memory_limit_mb, materialize):
+    """Run the job with the in-process executor, returning its output, the executor and the execution time."""
+    job = job_class(args=job_args)
+    temp_dir = tempfile.mkdtemp()
+    try:
+        executor = PipelinedStepExecutor(job, memory_limit_mb, materialize, temp_dir)
+        start_time = time.time()
+        output = executor.run(input_paths)
+        execution_time = time.time() - start_time
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return output, executor, execution_time
+
+
+def run_local_runner(job_class, job_args):
+    """Run the job with mrjob's runner (as selected by -r), returning its output and the execution time."""
+    job = job_class(args=job_args)
+    start_time = time.time()
+    with job.make_runner() as runner:
+        runner.run()
+        output = list(job.parse_output(runner.cat_output()))
+    return output, time.time() - start_time
+
+
+def normalize_output(output):
+    """Compare outputs independently of record order and of tuples vs. lists."""
+    return sorted(json.dumps(pair, sort_keys=True) for pair in output)
+
+
+#function to save result
+def save_result(runs, local_runner_time, outputs_match, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "8", f"New_Experiment_8_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        for mode, (output, executor, execution_time) in runs.items():
+            f.write("[{}] Execution time: {:.4f} seconds\n".format(mode, execution_time))
+            f.write("[{}] Peak memory: {:.2f} MB\n".format(mode, executor.peak_memory / (1024 ** 2)))
+            f.write("[{}] Spilled runs: {}\n".format(mode, executor.spills))
+            for step_num, handoff in executor.handoff_times().items():
+                f.write("[{}] Step {} -> {} hand-off time: {:.4f} seconds\n".format(mode, step_num + 1, step_num + 2, handoff))
+
+        if 'pipelined' in runs and 'materialized' in runs:
+            pipelined = runs['pipelined'][1].handoff_times()
+            materialized = runs['materialized'][1].handoff_times()
+            for step_num in sorted(set(pipelined) & set(materialized)):
+                f.write("Time saved at step {} -> {} boundary: {:.4f} seconds\n".format(
+                    step_num + 1, step_num + 2, materialized[step_num] - pipelined[step_num]))
+
+        if local_runner_time is not None:
+            f.write("[local runner] Execution time: {:.4f} seconds\n".format(local_runner_time))
+        if outputs_match is not None:
+            f.write("Outputs match: {}\n".format(outputs_match))
+
+
+if __name__ == '__main__':
+
+    # Options of this experiment; everything else is passed on to the job
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--job', choices=sorted(JOB_CLASSES), default='most-used-word', help="Two-step job to run")
+    parser.add_argument('--memory-limit', type=int, default=1024, help="Memory (MB) of buffered records above which sort buffers spill to disk")
+    parser.add_argument('--materialize', action='store_true', default=False, help="Hand records over through temporary files")
+    parser.add_argument('--benchmark', action='store_true', default=False,
+                        help="Run the pipelined and materialized modes and the local runner on the same input")
+    options, job_args = parser.parse_known_args(sys.argv[1:])
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    job_class = JOB_CLASSES[options.job]
+    input_paths = job_class(args=job_args).options.args
+
+    if options.benchmark:
+        modes = ['pipelined', 'materialized']
+    else:
+        modes = ['materialized' if options.materialize else 'pipelined']
+
+    runs = {}
+    for mode in modes:
+        runs[mode] = run_executor(job_class, job_args, input_paths, options.memory_limit, mode == 'materialized')
+
+    # Compare against the real local runner
+    local_runner_time = None
+    outputs_match = None
+    if options.benchmark:
+        local_output, local_runner_time = run_local_runner(job_class, job_args)
+        expected = normalize_output(local_output)
+        outputs_match = all(normalize_output(run[0]) == expected for run in runs.values())
+
+    # Print the job output
+    for key, value in runs[modes[0]][0]:
+        print(key, value)
+
+    # Save the performance metrics results
+    save_result(runs, local_runner_time, outputs_match, input_filename)
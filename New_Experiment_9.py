@@ -0,0 +1,396 @@
+'''
+New Experiment 9: Zero-Copy Input Staging and Reusable Job Working Directories:
+On every run the local runner builds a fresh temp directory, copies or re-splits the inputs into it and copies the job files
+(the job script, mrjob.zip when bootstrapping) into a simulated distributed cache, which is a large share of the startup overhead
+measured in Duplicated Experiment 1. Here a local runner stages inputs with hardlinks/symlinks when a split is a whole file and with
+kernel-side range copies (or memory-mapped views) otherwise, links job files instead of copying them, and caches mrjob.zip,
+unpacked archives and split boundaries by content hash across runs. Staging time is measured as its own metric for both runners.
+
+Input: Varied input text files (Eg. project_gutenberg_eBook_emma.txt, Tutorial_1_2_Input_1.txt, wikipedia-dump_chunk_1_mini.txt)
+Output : Staging time, startup overhead and execution time of the default and the zero-copy staging runner
+
+'''
+
+from mrjob.job import MRJob
+from mrjob.local import LocalMRJobRunner
+from mrjob.cat import is_compressed
+from mrjob.util import unarchive
+import hashlib
+import json
+import mmap
+import shutil
+import tempfile
+import time
+import datetime
+import os
+import sys
+
+# Default directory for content-hash addressed staging artifacts that are reused across runs
+DEFAULT_STAGE_CACHE_DIR = '.mrjob_stage_cache'
+
+# Blocks read to fingerprint a (possibly multi-GB) input file for the split cache
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+FINGERPRINT_BLOCKS = 16
+
+
+def file_sha1(path):
+    """Content hash of a whole file (used for job files and archives, which are small)."""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def input_fingerprint(path):
+    """
+    Sampled content hash of an input file: its inode, modification time and size plus FINGERPRINT_BLOCKS evenly spaced
+    blocks, including the first and the last one. Reading the whole of a multi-GB dump just to look up its split boundaries
+    would cost about as much as the copy we are trying to avoid, and edits outside the sampled blocks still change the
+    modification time.
+
+    :param path: Path of the input file.
+
+    :return: A hex digest.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    sha1 = hashlib.sha1(('%d:%d:%d' % (stat.st_ino, stat.st_mtime_ns, size)).encode('ascii'))
+    with open(path, 'rb') as f:
+        step = max((size - FINGERPRINT_BLOCK_SIZE) // max(FINGERPRINT_BLOCKS - 1, 1), 1)
+        for offset in range(0, max(size - FINGERPRINT_BLOCK_SIZE, 0) + 1, step):
+            f.seek(offset)
+            sha1.update(f.read(FINGERPRINT_BLOCK_SIZE))
+    return sha1.hexdigest()
+
+
+def splits_are_line_aligned(path, splits):
+    """
+    Check that cached split boundaries still cover the file and that every split but the last ends right after a newline.
+
+    :param path: Path of the input file.
+    :param splits: The (start, end) byte ranges.
+
+    :return: True if the splits can be used as they are.
+    """
+    size = os.path.getsize(path)
+    if not splits or splits[0][0] != 0 or splits[-1][1] != size:
+        return False
+    with open(path, 'rb') as f:
+        for (start, end), (next_start, _) in zip(splits, splits[1:]):
+            if end != next_start or end <= start:
+                return False
+            f.seek(end - 1)
+            if f.read(1) != b'\n':
+                return False
+    return True
+
+
+def line_aligned_splits(path, split_size):
+    """
+    Cut a file into (start, end) byte ranges of about split_size bytes that end on a newline.
+
+    :param path: Path of the input file.
+    :param split_size: Target size of each range.
+
+    :return: A list of ranges covering the whole file.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return [(0, 0)]
+
+    boundaries = [0]
+    with open(path, 'rb') as f:
+        while boundaries[-1] < size:
+            offset = boundaries[-1] + max(split_size, 1)
+            if offset >= size:
+                boundaries.append(size)
+                break
+            f.seek(offset - 1)
+            f.readline()  # Move to the start of the next line
+            boundaries.append(min(f.tell(), size))
+
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def link_or_copy(path, dest):
+    """
+    Make *dest* refer to *path* without copying its bytes where possible.
+
+    :return: How the file was staged: 'hardlink', 'symlink' or 'copy'.
+    """
+    try:
+        os.link(path, dest)
+        return 'hardlink'
+    except OSError:
+        pass
+    try:
+        os.symlink(os.path.abspath(path), dest)
+        return 'symlink'
+    except OSError:
+        shutil.copy(path, dest)
+        return 'copy'
+
+
+def copy_range(path, start, end, dest):
+    """
+    Copy bytes start..end of *path* into *dest* without passing them through Python buffers:
+    os.copy_file_range lets the kernel do it where available, otherwise we write from a memory-mapped view.
+    """
+    length = end - start
+    with open(path, 'rb') as src, open(dest, 'wb') as dst:
+        if length == 0:
+            return
+        if hasattr(os, 'copy_file_range'):
+            try:
+                offset = start
+                while offset < end:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), end - offset, offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+                if offset == end:
+                    return
+                dst.seek(0)
+                dst.truncate()
+            except OSError:
+                dst.seek(0)
+                dst.truncate()
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            dst.write(view[start:end])
+
+
+class TimedLocalMRJobRunner(LocalMRJobRunner):
+    """The default local runner, with the time spent staging inputs and job files measured."""
+
+    def __init__(self, **kwargs):
+        super(TimedLocalMRJobRunner, self).__init__(**kwargs)
+        self.staging_time = 0.0
+        self.staging_methods = {}
+
+    def _timed(self, method, *args):
+        start_time = time.time()
+        try:
+            return method(*args)
+        finally:
+            self.staging_time += time.time() - start_time
+
+    def _count_staging(self, how):
+        self.staging_methods[how] = self.staging_methods.get(how, 0) + 1
+
+    def _create_setup_wrapper_scripts(self):
+        return self._timed(super(TimedLocalMRJobRunner, self)._create_setup_wrapper_scripts)
+
+    def _create_dist_cache_dir(self, step_num):
+        return self._timed(super(TimedLocalMRJobRunner, self)._create_dist_cache_dir, step_num)
+
+    def _split_mapper_input(self, input_paths, step_num):
+        return self._timed(super(TimedLocalMRJobRunner, self)._split_mapper_input, input_paths, step_num)
+
+    def _setup_working_dir(self, task_type, step_num, task_num):
+        return self._timed(super(TimedLocalMRJobRunner, self)._setup_working_dir, task_type, step_num, task_num)
+
+
+class ZeroCopyLocalMRJobRunner(TimedLocalMRJobRunner):
+    """
+    Local runner that stages inputs and job files by reference and keeps content-hash addressed artifacts
+    (mrjob.zip, unpacked archives, split boundaries) in a cache directory that outlives the run's temp directory.
+    """
+
+    stage_cache_dir = DEFAULT_STAGE_CACHE_DIR
+
+    def _cache_path(self, *parts):
+        path = os.path.join(self.stage_cache_dir, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _create_mrjob_zip(self):
+        """Reuse a mrjob.zip built by an earlier run of the same mrjob version."""
+        if not self._mrjob_zip_path:
+            import mrjob
+            mrjob_dir = os.path.dirname(mrjob.__file__)
+            sha1 = hashlib.sha1()
+            for dir_name, _, file_names in sorted(os.walk(mrjob_dir)):
+                for file_name in sorted(file_names):
+                    if file_name.endswith('.py'):
+                        sha1.update(file_name.encode('utf-8'))
+                        with open(os.path.join(dir_name, file_name), 'rb') as f:
+                            sha1.update(f.read())
+            cached_zip = self._cache_path('mrjob-%s.zip' % sha1.hexdigest())
+
+            if os.path.exists(cached_zip):
+                self._count_staging('cached mrjob.zip')
+            else:
+                shutil.move(super(ZeroCopyLocalMRJobRunner, self)._create_mrjob_zip(), cached_zip)
+            self._mrjob_zip_path = cached_zip
+
+        return self._mrjob_zip_path
+
+    def _create_dist_cache_dir(self, step_num):
+        self._timed(self._create_linked_dist_cache_dir, step_num)
+
+    def _create_linked_dist_cache_dir(self, step_num):
+        """Link job files into the simulated distributed cache, and link archives unpacked once per content hash."""
+        cache_dir = self._dist_cache_dir(step_num)
+        self.fs.mkdir(cache_dir)
+
+        for name, path in self._working_dir_mgr.name_to_path('file').items():
+            path = path[len('file://'):] if path.startswith('file://') else path
+            self._count_staging(link_or_copy(path, self._path_in_dist_cache_dir(name, step_num)))
+
+        for name, path in self._working_dir_mgr.name_to_path('archive').items():
+            path = path[len('file://'):] if path.startswith('file://') else path
+            unpacked = self._cache_path('archives', file_sha1(path))
+            if not os.path.isdir(unpacked):
+                unarchive(path, unpacked + '.tmp')
+                os.rename(unpacked + '.tmp', unpacked)
+            else:
+                self._count_staging('cached archive')
+            os.symlink(os.path.abspath(unpacked), self._path_in_dist_cache_dir(name, step_num))
+            self._count_staging('symlink')
+
+    def _cached_line_splits(self, path, split_size):
+        """Split boundaries of an input file, cached by its fingerprint and the split size."""
+        cache_file = self._cache_path('splits', '%s-%d.json' % (input_fingerprint(path), split_size))
+        if os.path.exists(cache_file):
+            with open(cache_file) as f:
+                splits = [tuple(split) for split in json.load(f)]
+            # Never cut a record across two mappers because of a stale cache entry
+            if splits_are_line_aligned(path, splits):
+                self._count_staging('cached split metadata')
+                return splits
+
+        splits = line_aligned_splits(path, split_size)
+        with open(cache_file, 'w') as f:
+            json.dump(splits, f)
+        return splits
+
+    def _split_mapper_input(self, input_paths, step_num):
+        return self._timed(self._stage_mapper_input, list(input_paths), step_num)
+
+    def _stage_mapper_input(self, input_paths, step_num):
+        """Stage each split by linking the input file when it is a whole file, or by a range copy otherwise."""
+        if (step_num == 0 and self._uses_input_manifest()) or any(is_compressed(path) for path in input_paths):
+            # Manifests and compressed inputs keep the default handling
+            return super(TimedLocalMRJobRunner, self)._split_mapper_input(input_paths, step_num)
+
+        split_size = self._pick_mapper_split_size(input_paths, step_num)
+
+        results = []
+        for path in input_paths:
+            size = os.path.getsize(path)
+            for start, end in self._cached_line_splits(path, split_size):
+                dest = self._task_input_path('mapper', step_num, len(results))
+                self.fs.mkdir(os.path.dirname(dest))
+
+                if start == 0 and end == size:
+                    self._count_staging(link_or_copy(path, dest))
+                else:
+                    copy_range(path, start, end, dest)
+                    self._count_staging('range copy')
+
+                results.append(dict(file=path, start=start, length=end - start))
+
+        return results
+
+
+class MRStagedWordCount(MRJob):
+
+    def configure_args(self):
+        super(MRStagedWordCount, self).configure_args()
+        self.add_passthru_arg('--zero-copy-staging', action='store_true', default=False,
+                              help="Use the zero-copy staging runner with -r local")
+        self.add_passthru_arg('--stage-cache-dir', default=DEFAULT_STAGE_CACHE_DIR,
+                              help="Directory of staging artifacts reused across runs")
+        self.add_passthru_arg('--benchmark', action='store_true', default=False,
+                              help="Run the default runner and the zero-copy runner (cold and warm cache)")
+
+    def _runner_class(self):
+        # Swap in the measured local runners; other runners are left as they are
+        if self.options.runner == 'local':
+            if self.options.zero_copy_staging:
+                ZeroCopyLocalMRJobRunner.stage_cache_dir = self.options.stage_cache_dir
+                return ZeroCopyLocalMRJobRunner
+            return TimedLocalMRJobRunner
+        return super(MRStagedWordCount, self)._runner_class()
+
+    def mapper(self, _, line):
+        yield 'chars', len(line)
+        yield 'words', len(line.split())
+        yield 'lines', 1
+
+    def reducer(self, key, values):
+        yield key, sum(values)
+
+
+def run_job(job_args):
+    """Run the job, returning its output, execution time, staging time and how files were staged."""
+    job = MRStagedWordCount(args=job_args)
+    start_time = time.time()
+    with job.make_runner() as runner:
+        runner.run()
+        output = dict(job.parse_output(runner.cat_output()))
+        staging_time = getattr(runner, 'staging_time', None)
+        staging_methods = getattr(runner, 'staging_methods', {})
+    return output, time.time() - start_time, staging_time, staging_methods
+
+
+def is_task_invocation(options):
+    """The runner re-invokes this script with --mapper/--combiner/--reducer for every task."""
+    return options.run_mapper or options.run_combiner or options.run_reducer
+
+
+#function to save result
+def save_result(runs, input_filename):
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_name = os.path.splitext(os.path.basename(input_filename))[0]
+    filename = os.path.join("results", "New Experiment", "9", f"New_Experiment_9_Results_{input_name}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, "w") as f:
+        for name, (output, execution_time, staging_time, staging_methods) in runs.items():
+            f.write("[{}] Execution time: {:.4f} seconds\n".format(name, execution_time))
+            if staging_time is not None:
+                f.write("[{}] Staging time: {:.4f} seconds\n".format(name, staging_time))
+            for how, count in sorted(staging_methods.items()):
+                f.write("[{}] Staged by {}: {}\n".format(name, how, count))
+        outputs = [run[0] for run in runs.values()]
+        f.write("Outputs match: {}\n".format(all(output == outputs[0] for output in outputs)))
+
+
+if __name__ == '__main__':
+
+    # Get the input filename from command-line arguments for logs
+    input_filename = sys.argv[-1]
+
+    options = MRStagedWordCount(args=sys.argv[1:]).options
+
+    if is_task_invocation(options):
+        # Run a single mapper/combiner/reducer task
+        MRStagedWordCount.run()
+        sys.exit(0)
+
+    job_args = [arg for arg in sys.argv[1:] if arg not in ('--benchmark', '--zero-copy-staging')]
+
+    runs = {}
+    if options.benchmark:
+        # A cold run fills a fresh staging cache, the warm run reuses it (the --stage-cache-dir given is left alone)
+        benchmark_cache_dir = tempfile.mkdtemp(prefix='mrjob-stage-cache-')
+        zero_copy_args = job_args + ['--zero-copy-staging', '--stage-cache-dir', benchmark_cache_dir]
+        try:
+            runs['default staging'] = run_job(job_args)
+            runs['zero-copy staging (cold cache)'] = run_job(zero_copy_args)
+            runs['zero-copy staging (warm cache)'] = run_job(zero_copy_args)
+        finally:
+            shutil.rmtree(benchmark_cache_dir, ignore_errors=True)
+    elif options.zero_copy_staging:
+        runs['zero-copy staging'] = run_job(job_args + ['--zero-copy-staging'])
+    else:
+        runs['default staging'] = run_job(job_args)
+
+    # Print the job output
+    for key, value in sorted(list(runs.values())[0][0].items()):
+        print(key, value)
+
+    # Save the performance metrics results
+    save_result(runs, input_filename)